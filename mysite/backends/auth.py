@@ -0,0 +1,39 @@
+"""Authentication backend that keeps the users of sessions in the cache.
+
+AuthenticationMiddleware looks up the user of every authenticated
+request. CachedModelBackend answers that lookup from the cache for
+AUTH_USER_CACHE_TIMEOUT seconds; saving or deleting a user drops the
+cached copy (see polls.signals), so password changes and deactivations
+take effect on the next request.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the cached copy of a user."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user reads through the cache.
+
+    An AUTH_USER_CACHE_TIMEOUT of 0 turns the cache off.
+    """
+
+    def get_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        if not timeout:
+            return super().get_user(user_id)
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout)
+        return user
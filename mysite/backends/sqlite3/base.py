@@ -0,0 +1,44 @@
+"""SQLite backend with connection pragmas and a configurable BEGIN.
+
+Two extra OPTIONS are understood:
+
+    pragmas: Dict of PRAGMA name to value, run on every new connection,
+        such as {'journal_mode': 'WAL', 'busy_timeout': 5000}.
+    transaction_mode: 'DEFERRED', 'IMMEDIATE' or 'EXCLUSIVE', how atomic
+        blocks begin. IMMEDIATE takes the write lock up front, so a
+        transaction that reads before it writes waits for busy_timeout
+        instead of failing with "database is locked" on the lock upgrade.
+"""
+import re
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+_PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = kwargs.pop('pragmas', {})
+        self.transaction_mode = kwargs.pop('transaction_mode', None)
+        if self.transaction_mode not in (None, *TRANSACTION_MODES):
+            raise ImproperlyConfigured(
+                f'Invalid SQLite transaction_mode {self.transaction_mode!r}')
+        for name, value in self.pragmas.items():
+            if not name.isidentifier() or not _PRAGMA_VALUE.match(str(value)):
+                raise ImproperlyConfigured(f'Invalid SQLite pragma {name}={value!r}')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # busy_timeout first, switching journal_mode may wait for a lock.
+        for name, value in sorted(self.pragmas.items(), key=lambda item: item[0] != 'busy_timeout'):
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,55 @@
+"""Django template backend that times its renders.
+
+QueryStatsMiddleware reports the time each request spends rendering
+templates. Views that call render() or render_to_string render inside
+the view, out of reach of process_template_response, so the templates
+of this backend add their own render time to the render_timer of the
+current request, however they are rendered.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+_render_time = ContextVar('render_time', default=None)
+
+
+@contextmanager
+def render_timer():
+    """Collect the render time of the templates rendered in the block.
+
+    Yields:
+        A list holding the seconds spent rendering, updated in place.
+    """
+    total = [0.0]
+    token = _render_time.set(total)
+    try:
+        yield total
+    finally:
+        _render_time.reset(token)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        total = _render_time.get()
+        if total is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            total[0] += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates whose templates report to render_timer."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,296 @@
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from urllib.parse import urlparse
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from mysite.backends.templates import render_timer
+from mysite.routers import PIN_COOKIE, choose_read_alias, use_read_alias
+
+
+class QueryTimer:
+    """Execute wrapper that counts and times the SQL of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, '')
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed > self.slowest[0]:
+                self.slowest = (elapsed, sql)
+
+
+class QueryStats:
+    """Rolling per-view window of request timings.
+
+    Attributes:
+        window (int): Number of requests kept per view.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._slowest = {}
+
+    def record(self, view, total, sql, queries, render, slowest):
+        """Add the timings (in seconds) of one request of view."""
+        with self._lock:
+            self._samples[view].append((total, sql, queries, render))
+            if slowest[0] > self._slowest.get(view, (0.0, ''))[0]:
+                self._slowest[view] = slowest
+
+    def summary(self):
+        """Returns p50/p95/p99 of each view, times in milliseconds."""
+        with self._lock:
+            samples = {view: list(rows) for view, rows in self._samples.items()}
+            slowest = dict(self._slowest)
+        summary = {}
+        for view, rows in samples.items():
+            columns = dict(zip(('total_ms', 'sql_ms', 'queries', 'render_ms'), zip(*rows)))
+            summary[view] = {'requests': len(rows)}
+            for name, values in columns.items():
+                scale = 1 if name == 'queries' else 1000
+                summary[view][name] = {
+                    f'p{p}': percentile(values, p) * scale for p in (50, 95, 99)}
+            duration, sql = slowest.get(view, (0.0, ''))
+            summary[view]['slowest_sql'] = {'ms': duration * 1000, 'sql': sql[:500]}
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._slowest.clear()
+
+
+def percentile(values, p):
+    """Returns the p-th percentile of values, nearest-rank method."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[rank - 1]
+
+
+query_stats = QueryStats()
+
+
+class QueryStatsMiddleware:
+    """Measure SQL and render time of each request.
+
+    Adds a Server-Timing header and feeds query_stats, which staff can
+    read at /stats/queries/. Render time is the time spent in templates
+    of the mysite.backends.templates backend, whether the view returns
+    a TemplateResponse or calls render(). Enabled by
+    settings.QUERY_STATS_ENABLED; when disabled the middleware removes
+    itself from the chain.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_STATS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        query_stats.window = settings.QUERY_STATS_WINDOW
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            rendering = stack.enter_context(render_timer())
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        render = rendering[0]
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"',
+            f'db-slowest;dur={timer.slowest[0] * 1000:.1f}',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        query_stats.record(view, total, timer.duration, timer.count, render, timer.slowest)
+        return response
+
+
+class ConnectionHealthMiddleware:
+    """Close persistent database connections that stopped working.
+
+    Connections kept open by CONN_MAX_AGE can be dropped by the server or
+    a proxy between requests. Each open connection is pinged before the
+    request and closed when unusable, so the request opens a fresh one
+    instead of failing. Enabled by settings.DATABASE_CONN_HEALTH_CHECKS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_CONN_HEALTH_CHECKS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for connection in connections.all():
+            if (connection.connection is not None and not connection.in_atomic_block
+                    and not connection.is_usable()):
+                connection.close()
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Choose the database that the reads of a request go to.
+
+    A request that may write (any unsafe method) reads from the primary
+    and leaves a cookie that keeps the client on the primary for
+    settings.DATABASE_REPLICA_LAG seconds, long enough for the replicas
+    to catch up. Other requests to the listing and results views of
+    settings.READ_REPLICA_VIEWS read from one replica, the rest from the
+    primary. Removes itself from the chain when no replica is configured.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler call the async branch without a thread hop.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        writes = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        with use_read_alias(choose_read_alias(self.pinned(request, writes))):
+            response = self.get_response(request)
+        return self.pin(response, writes)
+
+    async def __acall__(self, request):
+        writes = request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        with use_read_alias(choose_read_alias(self.pinned(request, writes))):
+            response = await self.get_response(request)
+        return self.pin(response, writes)
+
+    def pinned(self, request, writes):
+        """Returns True when the reads of request must go to the primary."""
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0.0
+        return writes or pinned_until > time.time() or not self.reads_replicas(request)
+
+    @staticmethod
+    def pin(response, writes):
+        """Keep the client of a writing request on the primary for a while."""
+        if writes and settings.DATABASE_REPLICA_LAG > 0:
+            lag = settings.DATABASE_REPLICA_LAG
+            response.set_cookie(PIN_COOKIE, f'{time.time() + lag:.3f}',
+                                max_age=lag, httponly=True, samesite='Lax')
+        return response
+
+    @staticmethod
+    def reads_replicas(request):
+        """Returns True when the view of request may read from a replica."""
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.READ_REPLICA_VIEWS
+
+
+class StaticFilesMiddleware:
+    """Serve the collected static files with far-future caching.
+
+    Requests under settings.STATIC_URL are answered from STATIC_ROOT
+    before the session, authentication and views run. Hashed names from
+    the manifest of mysite.storage never change, so they are cached for
+    a year as immutable; other names for settings.STATIC_MAX_AGE seconds.
+    The .br or .gz version written by collectstatic is sent to clients
+    that accept it. Removes itself when settings.SERVE_STATIC is off or
+    collectstatic has not run.
+    """
+
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        root = settings.STATIC_ROOT
+        if not settings.SERVE_STATIC or not root or not os.path.isdir(root):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.root = root
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        found = self.find(request)
+        if found is None:
+            return self.get_response(request)
+        return self.serve(request, *found)
+
+    async def __acall__(self, request):
+        found = self.find(request)
+        if found is None:
+            return await self.get_response(request)
+        return self.serve(request, *found)
+
+    def find(self, request):
+        """Returns the (name, path) of the static file of request, or None."""
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        return name, path
+
+    def serve(self, request, name, path):
+        immutable = name in self.immutable
+        mtime = os.stat(path).st_mtime
+        if not immutable and not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'), mtime):
+            return HttpResponseNotModified()
+        accepted = {part.split(';')[0].strip()
+                    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')}
+        encoding = None
+        for candidate, suffix in self.encodings:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, path = candidate, path + suffix
+                break
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+        del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Last-Modified'] = http_date(mtime)
+        if immutable:
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}'
+        return response
@@ -0,0 +1,60 @@
+"""Send reads to the read replicas and writes to the primary database.
+
+Replica aliases are listed in settings.READ_REPLICAS. Only the reads of
+the views named in settings.READ_REPLICA_VIEWS go to a replica, and only
+while the client is not pinned to the primary: a request is pinned while
+it may write and, through PIN_COOKIE, for settings.DATABASE_REPLICA_LAG
+seconds afterwards, so a client reads its own writes; see
+mysite.middleware.ReplicaRoutingMiddleware. Every other read, including
+those of management commands and background threads, uses the primary.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary_until'
+
+# Alias that reads of the current request or task go to, None for the
+# primary.
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def choose_read_alias(pinned=False):
+    """Returns the alias reads should use, the primary when pinned."""
+    if pinned or not settings.READ_REPLICAS:
+        return PRIMARY
+    return random.choice(settings.READ_REPLICAS)
+
+
+@contextmanager
+def use_read_alias(alias):
+    """Send the reads of the enclosed block to alias."""
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def pin_to_primary():
+    """Send the reads of the enclosed block to the primary."""
+    return use_read_alias(PRIMARY)
+
+
+class PrimaryReplicaRouter:
+    """Database router for one primary and any number of read replicas."""
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 import os.path
 
 
@@ -44,7 +44,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mysite.middleware.QueryStatsMiddleware',
+    'mysite.middleware.ConnectionHealthMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'mysite.middleware.StaticFilesMiddleware',
+    'mysite.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,11 +57,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL timing, see mysite.middleware.QueryStatsMiddleware.
+QUERY_STATS_ENABLED = config('QUERY_STATS_ENABLED', cast=bool, default=False)
+QUERY_STATS_WINDOW = config('QUERY_STATS_WINDOW', cast=int, default=1000)
+
 ROOT_URLCONF = 'mysite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render times to QueryStatsMiddleware.
+        'BACKEND': 'mysite.backends.templates.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,7 +83,9 @@ TEMPLATES = [
 WSGI_APPLICATION = 'mysite.wsgi.application'
 
 AUTHENTICATION_BACKENDS = [
-    # username/password authentication
+    # username/password authentication, users of sessions may be cached
+    'mysite.backends.auth.CachedModelBackend',
+    # sessions logged in before the cached backend existed
     'django.contrib.auth.backends.ModelBackend',
 ]
 
@@ -86,11 +97,148 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': config('DATABASE_ENGINE', cast=str, default='mysite.backends.sqlite3'),
+        'NAME': config('DATABASE_NAME', cast=str, default=str(BASE_DIR / 'db.sqlite3')),
+        'USER': config('DATABASE_USER', cast=str, default=''),
+        'PASSWORD': config('DATABASE_PASSWORD', cast=str, default=''),
+        'HOST': config('DATABASE_HOST', cast=str, default=''),
+        'PORT': config('DATABASE_PORT', cast=str, default=''),
+        # Seconds a connection is reused across requests, 0 closes it
+        # after every request.
+        'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', cast=int, default=60),
+    }
+}
+
+if DATABASES['default']['ENGINE'] == 'mysite.backends.sqlite3':
+    # Connection setup of mysite.backends.sqlite3. WAL lets readers run
+    # alongside the writer and busy_timeout makes writers queue instead
+    # of failing with "database is locked".
+    DATABASES['default']['OPTIONS'] = {
+        'pragmas': {
+            'journal_mode': config('SQLITE_JOURNAL_MODE', cast=str, default='WAL'),
+            'synchronous': config('SQLITE_SYNCHRONOUS', cast=str, default='NORMAL'),
+            'busy_timeout': config('SQLITE_BUSY_TIMEOUT', cast=int, default=5000),
+            'cache_size': config('SQLITE_CACHE_SIZE', cast=int, default=-20000),
+            'mmap_size': config('SQLITE_MMAP_SIZE', cast=int, default=134217728),
+        },
+        'transaction_mode': config('SQLITE_TRANSACTION_MODE', cast=str, default='IMMEDIATE'),
+    }
+
+# Check that a reused connection still works before each request, see
+# mysite.middleware.ConnectionHealthMiddleware.
+DATABASE_CONN_HEALTH_CHECKS = config(
+    'DATABASE_CONN_HEALTH_CHECKS', cast=bool, default=False)
+
+# Read replicas of the default database, SQLite files or, for other
+# engines, hosts. Reads are routed by mysite.routers.PrimaryReplicaRouter.
+READ_REPLICAS = []
+for index, replica in enumerate(config('DATABASE_REPLICAS', cast=Csv(), default='')):
+    alias = f'replica{index}'
+    location = 'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+    DATABASES[alias] = {**DATABASES['default'], location: replica,
+                        'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['mysite.routers.PrimaryReplicaRouter']
+
+# Views whose reads may go to a replica, every other read uses the primary.
+READ_REPLICA_VIEWS = [
+    'polls:index', 'polls:results', 'polls:archive', 'polls:question_list_json',
+    'polls:results_batch_json', 'polls:results_json', 'polls:results_timeline',
+]
+
+# Seconds a client keeps reading from the primary after a write.
+DATABASE_REPLICA_LAG = config('DATABASE_REPLICA_LAG', cast=float, default=5.0)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND', cast=str, default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', cast=str, default=''),
     }
 }
 
+# Whether every worker process sees the same cache. A per-process cache
+# cannot hold sessions or users: a logout, password change or
+# deactivation would only reach the process that handled it.
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith(('.LocMemCache', '.DummyCache'))
+
+# Sessions are read from the cache and written through to the database
+# when the cache is shared, else they always query. signed_cookies needs
+# no storage at all.
+SESSION_ENGINE = config(
+    'SESSION_ENGINE', cast=str,
+    default='django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db')
+
+# Seconds the user of a session is cached, 0 reads it on every request.
+AUTH_USER_CACHE_TIMEOUT = config(
+    'AUTH_USER_CACHE_TIMEOUT', cast=int, default=300 if SHARED_CACHE else 0)
+
+# Seconds that results of an open poll may be served from the cache.
+POLLS_RESULTS_CACHE_TIMEOUT = config(
+    'POLLS_RESULTS_CACHE_TIMEOUT', cast=int, default=30)
+
+# Seconds the results version and last change time of a question are
+# kept, and the results of a closed one. Bounds the keys left by requests
+# for ids that name no question.
+POLLS_RESULTS_VERSION_TIMEOUT = config(
+    'POLLS_RESULTS_VERSION_TIMEOUT', cast=int, default=86400)
+
+# Ranked and approval tallies, see polls.results.TallyScheduler: seconds
+# between a ballot and its background tally, and age in seconds after
+# which a served tally schedules a new one.
+POLLS_TALLY_DELAY = config('POLLS_TALLY_DELAY', cast=float, default=2.0)
+POLLS_TALLY_MAX_AGE = config('POLLS_TALLY_MAX_AGE', cast=float, default=60.0)
+
+# Longest time in seconds that the question list of the index is cached.
+POLLS_INDEX_CACHE_TIMEOUT = config(
+    'POLLS_INDEX_CACHE_TIMEOUT', cast=int, default=300)
+
+# Route the index, results and vote pages to polls.async_views (ASGI).
+POLLS_ASYNC_VIEWS = config('POLLS_ASYNC_VIEWS', cast=bool, default=False)
+
+# Live results streams, see polls.pubsub. Only served by WSGI workers,
+# each open stream holds a worker thread.
+POLLS_LIVE_RESULTS = config('POLLS_LIVE_RESULTS', cast=bool, default=False)
+POLLS_PUBSUB_BACKEND = config(
+    'POLLS_PUBSUB_BACKEND', cast=str, default='polls.pubsub.InMemoryBroker')
+POLLS_SSE_MAX_CONNECTIONS = config('POLLS_SSE_MAX_CONNECTIONS', cast=int, default=100)
+POLLS_SSE_HEARTBEAT = config('POLLS_SSE_HEARTBEAT', cast=float, default=15.0)
+POLLS_SSE_MAX_DURATION = config('POLLS_SSE_MAX_DURATION', cast=float, default=300.0)
+
+# Admission control of the vote views, see polls.throttle. Rates are
+# votes per second refilling a bucket of burst votes, 0 turns a limit off.
+# META key of the client address set by a trusted proxy, for example
+# HTTP_X_FORWARDED_FOR, REMOTE_ADDR is used when empty. Set it behind a
+# proxy, where REMOTE_ADDR is the proxy for every client.
+POLLS_CLIENT_IP_HEADER = config('POLLS_CLIENT_IP_HEADER', cast=str, default='')
+POLLS_VOTE_USER_RATE = config('POLLS_VOTE_USER_RATE', cast=float, default=1.0)
+POLLS_VOTE_USER_BURST = config('POLLS_VOTE_USER_BURST', cast=int, default=5)
+POLLS_VOTE_IP_RATE = config('POLLS_VOTE_IP_RATE', cast=float, default=20.0)
+POLLS_VOTE_IP_BURST = config('POLLS_VOTE_IP_BURST', cast=int, default=100)
+POLLS_VOTE_MAX_CONCURRENCY = config('POLLS_VOTE_MAX_CONCURRENCY', cast=int, default=32)
+POLLS_VOTE_BUSY_RETRY_AFTER = config('POLLS_VOTE_BUSY_RETRY_AFTER', cast=int, default=1)
+# The cache limiter is only shared between processes with a shared cache.
+POLLS_RATE_LIMIT_BACKEND = config(
+    'POLLS_RATE_LIMIT_BACKEND', cast=str,
+    default='polls.throttle.CacheRateLimiter' if SHARED_CACHE
+    else 'polls.throttle.MemoryRateLimiter')
+POLLS_RATE_LIMIT_MAX_KEYS = config('POLLS_RATE_LIMIT_MAX_KEYS', cast=int, default=100000)
+
+# Write-behind vote ingestion, see polls.buffer.
+POLLS_VOTE_BUFFER = config('POLLS_VOTE_BUFFER', cast=bool, default=False)
+POLLS_VOTE_BUFFER_BATCH_SIZE = config(
+    'POLLS_VOTE_BUFFER_BATCH_SIZE', cast=int, default=500)
+POLLS_VOTE_BUFFER_FLUSH_INTERVAL = config(
+    'POLLS_VOTE_BUFFER_FLUSH_INTERVAL', cast=float, default=1.0)
+POLLS_VOTE_BUFFER_MAX_PENDING = config(
+    'POLLS_VOTE_BUFFER_MAX_PENDING', cast=int, default=10000)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -128,6 +276,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic writes hashed, precompressed copies of the assets here,
+# see mysite.storage.
+STATIC_ROOT = config('STATIC_ROOT', cast=str, default=str(BASE_DIR / 'staticfiles'))
+STATICFILES_STORAGE = 'mysite.storage.CompressedManifestStaticFilesStorage'
+
+# Serve STATIC_ROOT from the app server, see mysite.middleware.StaticFilesMiddleware,
+# and seconds that files without a hash in their name may be cached.
+SERVE_STATIC = config('SERVE_STATIC', cast=bool, default=True)
+STATIC_MAX_AGE = config('STATIC_MAX_AGE', cast=int, default=60)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
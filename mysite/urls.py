@@ -24,4 +24,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('signup/', views.signup, name="signup"),
+    path('stats/queries/', views.query_stats_summary, name="query_stats"),
 ]
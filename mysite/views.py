@@ -1,6 +1,10 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, authenticate
+from django.conf import settings
+from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from .middleware import query_stats
 
 
 def signup(request):
@@ -8,14 +12,19 @@ def signup(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
-            form.save()
-            username = form.cleaned_data.get('username')
-            raw_passwd = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=raw_passwd)
-            login(request, user)
-            return redirect('polls')
+            # The form has just checked and hashed the password, so log
+            # the new user in directly instead of hashing it again.
+            user = form.save()
+            login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
+            return redirect('polls:index')
         # what if form is not valid?
         # we should display a message in signup.html
     else:
         form = UserCreationForm()
     return render(request, 'registration/signup.html', {'form': form})
+
+
+@staff_member_required
+def query_stats_summary(request):
+    """Return the per-view SQL and render timings as JSON."""
+    return JsonResponse(query_stats.summary())
@@ -1,7 +1,106 @@
 from django.contrib import admin
-from .models import Question, Choice, Vote
+from django.db.models.functions import Lower
+from .export import export_response
+from .models import Ballot, Question, Choice, Vote
+from .pagination import EstimatedCountPaginator
 
-# Register your models here.
-admin.site.register(Question)
-admin.site.register(Choice)
-admin.site.register(Vote)
+
+def _export_action(kind, fmt, description):
+    def action(modeladmin, request, queryset):
+        return export_response(kind, fmt, question_ids=queryset.values('pk'))
+    action.__name__ = f'export_{kind}_{fmt}'
+    return admin.action(description=description)(action)
+
+
+class ChoiceInline(admin.TabularInline):
+    """Choices of a question with their materialized tallies."""
+
+    model = Choice
+    fields = ('choice_text', 'vote_count')
+    readonly_fields = ('vote_count',)
+    extra = 0
+
+
+@admin.register(Question)
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('question_text', 'kind', 'pub_date', 'end_date')
+    search_fields = ('question_text',)
+    ordering = ('-pub_date', '-pk')
+    inlines = [ChoiceInline]
+    actions = [
+        _export_action('votes', 'csv', 'Export votes as CSV'),
+        _export_action('votes', 'ndjson', 'Export votes as NDJSON'),
+        _export_action('tallies', 'csv', 'Export tallies as CSV'),
+        _export_action('tallies', 'ndjson', 'Export tallies as NDJSON'),
+    ]
+
+    def get_search_results(self, request, queryset, search_term):
+        """Returns the questions whose text starts with search_term.
+
+        The match ignores case. The prefix is matched as a range of the
+        lowercased text, which question_text_lower_idx serves on every
+        database; the LIKE and UPPER of the istartswith lookup cannot use
+        an index. The range ends before the prefix with its last character
+        incremented, and startswith drops whatever a collation sorts into
+        the range without the prefix.
+        """
+        prefix = search_term.strip().lower()
+        if not prefix:
+            return queryset, False
+        queryset = queryset.alias(text_lower=Lower('question_text')).filter(
+            text_lower__gte=prefix, text_lower__startswith=prefix)
+        upper = _prefix_upper_bound(prefix)
+        if upper is not None:
+            queryset = queryset.filter(text_lower__lt=upper)
+        return queryset, False
+
+
+def _prefix_upper_bound(prefix):
+    """Returns the smallest string above every string starting with prefix.
+
+    None when the prefix is only made of the last code point.
+    """
+    prefix = prefix.rstrip(chr(0x10ffff))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+@admin.register(Choice)
+class ChoiceAdmin(admin.ModelAdmin):
+    list_display = ('choice_text', 'question', 'vote_count')
+    list_select_related = ('question',)
+    raw_id_fields = ('question',)
+    readonly_fields = ('vote_count',)
+    search_fields = ('=question__id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Vote)
+class VoteAdmin(admin.ModelAdmin):
+    """Vote changelist that stays fast on millions of rows.
+
+    Rows are joined with their user, question and choice, foreign keys are
+    edited by id, search is an exact match on the unique username and the
+    unfiltered count is estimated.
+    """
+
+    list_display = ('id', 'user', 'question', 'choice')
+    list_select_related = ('user', 'question', 'choice')
+    raw_id_fields = ('user', 'question', 'choice')
+    search_fields = ('=user__username',)
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Ballot)
+class BallotAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'question', 'choice_ids')
+    list_select_related = ('user', 'question')
+    raw_id_fields = ('user', 'question')
+    search_fields = ('=user__username',)
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
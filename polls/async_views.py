@@ -0,0 +1,124 @@
+"""Async versions of the index, results and vote views for ASGI servers.
+
+Django 4.0 has no async ORM, so database work runs in a single
+sync_to_async hop per request and cache hits run on the event loop.
+polls.urls routes these views when settings.POLLS_ASYNC_VIEWS is True.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from polls.buffer import get_vote_buffer
+from polls.fragments import aget_index_fragment
+from polls.models import Question
+from polls.results import aget_results, bump_results_version, schedule_tally
+from polls.throttle import admission_control
+from polls.voted import fill_voted, get_voted, remember_ballot, remember_vote
+from polls.voting import cast_ballot, cast_vote, parse_ballot
+
+
+async def aget_user(request):
+    """Returns the user of request without touching the session lazily.
+
+    A request without a session cookie is anonymous, so no thread hop is
+    needed to find out.
+    """
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return AnonymousUser()
+    return await sync_to_async(get_user)(request)
+
+
+async def index(request):
+    """Async IndexView, displays the last five published questions."""
+    request.user = await aget_user(request)
+    questions = Question.objects.published().with_is_open()
+    questions = questions.order_by('-pub_date')[:5]
+    voted = {}
+    if request.user.is_authenticated:
+        voted = await sync_to_async(get_voted)(request)
+    context = {
+        'latest_question_list': questions,
+        'question_list_html': fill_voted(await aget_index_fragment(questions), voted),
+    }
+    return render(request, 'polls/index.html', context)
+
+
+async def results(request, pk):
+    """Async ResultsView, displays the cached results of a question."""
+    question = await aget_results(pk)
+    if question is None:
+        raise Http404('No question found matching the query')
+    return render(request, 'polls/results.html', {'question': question})
+
+
+def _record_vote(request, question_id, choice_id):
+    """Sync part of vote, returns the question and the outcome.
+
+    The outcome is 'voted', 'no_choice' or 'closed'. The choices of the
+    question are prefetched so the caller can render it without a query.
+    """
+    questions = Question.objects.prefetch_related('choice_set')
+    question = get_object_or_404(questions, pk=question_id)
+    if question.uses_ballots():
+        return _record_ballot(request, question)
+    selected_choice = next(
+        (choice for choice in question.choice_set.all()
+         if str(choice.pk) == choice_id), None)
+    if selected_choice is None:
+        return question, 'no_choice'
+    if not question.can_vote():
+        return question, 'closed'
+    user = request.user
+    buffered = settings.POLLS_VOTE_BUFFER and get_vote_buffer().submit(
+        user.pk, question.id, selected_choice.id)
+    if not buffered:
+        cast_vote(user, selected_choice)
+        bump_results_version(question.id)
+    remember_vote(request, question.id, selected_choice)
+    return question, 'voted'
+
+
+def _record_ballot(request, question):
+    """_record_vote of a ranked or approval question.
+
+    The outcome can also be the message of an invalid ballot.
+    """
+    try:
+        choice_ids = parse_ballot(question, request.POST)
+    except ValueError as error:
+        return question, str(error)
+    if not question.can_vote():
+        return question, 'closed'
+    cast_ballot(request.user, question, choice_ids)
+    schedule_tally(question.id)
+    remember_ballot(request, question, choice_ids)
+    return question, 'voted'
+
+
+@admission_control
+async def vote(request, question_id):
+    """Async vote, to vote a choice for each question.
+
+    args:
+        question_id: Id of this question.
+    """
+    user = await aget_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    request.user = user
+    question, outcome = await sync_to_async(_record_vote)(
+        request, question_id, request.POST.get('choice'))
+    if outcome == 'closed':
+        messages.error(request, 'User cannot vote')
+        return HttpResponseRedirect(reverse('polls:index'))
+    if outcome != 'voted':
+        dict_return = {'question': question}
+        dict_return['error_message'] = (
+            "You didn't select a choice" if outcome == 'no_choice' else outcome)
+        return render(request, 'polls/detail.html', dict_return)
+    return HttpResponseRedirect(reverse('polls:results', args=[question.id]))
@@ -0,0 +1,203 @@
+"""Synthetic dataset and load driver for the polls views.
+
+Used by the benchmark_polls management command and by the query budget
+tests. Every request goes through the in-process test client.
+"""
+import asyncio
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from mysite.middleware import percentile
+from polls.models import Choice, Question, Vote
+
+# Most queries a single request of each endpoint may run, counting the
+# session and user lookups of a logged in client. The detail page of a
+# question missing from the map of voted questions (polls.voted) looks up
+# the vote. A vote also saves the session, which keeps that map, and adds
+# to the turnout rollups (polls.rollups).
+QUERY_BUDGETS = {
+    'index': 4,
+    'detail': 5,
+    'results': 3,
+    'vote': 13,
+}
+
+
+def seed(questions=100, choices=4, votes=1000, users=100, rng=None, batch_size=1000):
+    """Bulk create a synthetic dataset.
+
+    Args:
+        questions: Number of questions, all published and open.
+        choices: Number of choices per question.
+        votes: Number of votes, at most one per user and question.
+        users: Number of users.
+        rng: random.Random used to spread the votes.
+
+    Returns:
+        Dict with the created question ids, choice ids per question and
+        user ids.
+    """
+    rng = rng or random.Random(0)
+    votes = min(votes, questions * users)
+    now = timezone.now()
+    User.objects.bulk_create(
+        [User(username=f'bench-{i}', password='!') for i in range(users)],
+        batch_size=batch_size)
+    Question.objects.bulk_create(
+        [Question(question_text=f'Benchmark question {i}',
+                  pub_date=now - datetime.timedelta(minutes=questions - i))
+         for i in range(questions)], batch_size=batch_size)
+    question_ids = list(Question.objects.filter(
+        question_text__startswith='Benchmark question ').values_list('pk', flat=True))
+    Choice.objects.bulk_create(
+        [Choice(question_id=question_id, choice_text=f'Choice {j}')
+         for question_id in question_ids for j in range(choices)],
+        batch_size=batch_size)
+    choice_ids = {}
+    for choice_id, question_id in (Choice.objects.filter(question_id__in=question_ids)
+                                   .values_list('pk', 'question_id')):
+        choice_ids.setdefault(question_id, []).append(choice_id)
+    user_ids = list(User.objects.filter(username__startswith='bench-')
+                    .values_list('pk', flat=True))
+
+    pairs = rng.sample(range(questions * users), votes)
+    tallies = Counter()
+    rows = []
+    for pair in pairs:
+        question_id = question_ids[pair % questions]
+        choice_id = rng.choice(choice_ids[question_id])
+        tallies[choice_id] += 1
+        rows.append(Vote(user_id=user_ids[pair // questions],
+                         question_id=question_id, choice_id=choice_id))
+    Vote.objects.bulk_create(rows, batch_size=batch_size)
+    Choice.objects.bulk_update(
+        [Choice(pk=choice_id, vote_count=count) for choice_id, count in tallies.items()],
+        ['vote_count'], batch_size=batch_size)
+    return {'questions': question_ids, 'choices': choice_ids, 'users': user_ids}
+
+
+def request_endpoint(client, endpoint, dataset, rng):
+    """Send one request of endpoint with random question and choice."""
+    question_id = rng.choice(dataset['questions'])
+    if endpoint == 'index':
+        return client.get(reverse('polls:index'))
+    if endpoint == 'detail':
+        return client.get(reverse('polls:detail', args=(question_id,)))
+    if endpoint == 'results':
+        return client.get(reverse('polls:results', args=(question_id,)))
+    if endpoint == 'vote':
+        choice_id = rng.choice(dataset['choices'][question_id])
+        # A urlencoded body, the multipart one trips AsyncClient in Django 4.0.
+        return client.post(reverse('polls:vote', args=(question_id,)),
+                           urlencode({'choice': choice_id}),
+                           content_type='application/x-www-form-urlencoded')
+    raise ValueError(f'Unknown endpoint {endpoint!r}')
+
+
+def measure_queries(client, endpoint, dataset, rng=None):
+    """Returns the number of queries of one request of endpoint."""
+    with CaptureQueriesContext(connection) as queries:
+        request_endpoint(client, endpoint, dataset, rng or random.Random(0))
+    return len(queries)
+
+
+def run(endpoint, dataset, requests=200, concurrency=4, seed_value=0):
+    """Drive endpoint from concurrency threads and time each request.
+
+    Returns:
+        Dict with the number of requests, throughput, latency percentiles
+        in milliseconds, most queries seen in a successful request and
+        the number of failed requests.
+    """
+    latencies, max_queries, errors = [], [0], [0]
+    lock = threading.Lock()
+    per_thread = max(1, requests // concurrency)
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        client = Client()
+        client.force_login(User.objects.get(pk=dataset['users'][index % len(dataset['users'])]))
+        try:
+            for _ in range(per_thread):
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    try:
+                        status = request_endpoint(client, endpoint, dataset, rng).status_code
+                    except Exception:
+                        status = 500
+                    elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    if status >= 400:
+                        errors[0] += 1
+                    else:
+                        max_queries[0] = max(max_queries[0], len(queries))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return _report(endpoint, latencies, wall, max_queries[0], errors[0])
+
+
+def run_async(endpoint, dataset, requests=200, concurrency=4, seed_value=0):
+    """Drive endpoint through the ASGI handler from concurrency tasks.
+
+    Like run, but queries cannot be counted across the ORM thread, so
+    max_queries is None.
+    """
+    latencies, errors = [], [0]
+    per_task = max(1, requests // concurrency)
+
+    async def worker(index):
+        rng = random.Random(seed_value + index)
+        client = AsyncClient()
+        user_id = dataset['users'][index % len(dataset['users'])]
+        user = await sync_to_async(User.objects.get)(pk=user_id)
+        await sync_to_async(client.force_login)(user)
+        for _ in range(per_task):
+            start = time.perf_counter()
+            try:
+                status = (await request_endpoint(client, endpoint, dataset, rng)).status_code
+            except Exception:
+                status = 500
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors[0] += 1
+
+    async def main():
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    wall = time.perf_counter() - start
+    return _report(endpoint, latencies, wall, None, errors[0])
+
+
+def _report(endpoint, latencies, wall, max_queries, errors):
+    return {
+        'endpoint': endpoint,
+        'requests': len(latencies),
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_queries': max_queries,
+        'budget': QUERY_BUDGETS.get(endpoint),
+        'errors': errors,
+    }
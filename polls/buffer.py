@@ -0,0 +1,205 @@
+import atexit
+import datetime
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from polls.models import Choice, Vote
+from polls.results import bump_results_version
+from polls.rollups import record_vote_events
+from polls.voting import cast_vote
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    """In-process write-behind buffer for votes.
+
+    Ballots are kept per (user, question), so a newer ballot replaces a
+    pending one and the last vote of a user always wins. A background
+    thread writes the pending ballots with bulk queries every
+    flush_interval seconds, or sooner when batch_size ballots are waiting.
+
+    Attributes:
+        batch_size (int): Number of ballots written per transaction.
+        flush_interval (float): Seconds between two flushes.
+        max_pending (int): Number of pending ballots before submit refuses.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {
+            'submitted': 0,
+            'flushed': 0,
+            'dropped': 0,
+            'batches': 0,
+            'last_batch_size': 0,
+            'last_flush_lag': 0.0,
+            'max_flush_lag': 0.0,
+        }
+
+    def submit(self, user_id, question_id, choice_id):
+        """Queue a ballot, returns False when the buffer is full.
+
+        A ballot of a user whose earlier ballot is still pending or being
+        written is always accepted, so it cannot be overtaken by a direct
+        write of the caller.
+        """
+        key = (user_id, question_id)
+        with self._lock:
+            known = key in self._pending or key in self._inflight
+            if not known and len(self._pending) >= self.max_pending:
+                return False
+            queued_at = self._pending.get(key, (None, time.monotonic()))[1]
+            self._pending[key] = (choice_id, queued_at)
+            self._stats['submitted'] += 1
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+        return True
+
+    def flush(self):
+        """Write every pending ballot, one batch per transaction."""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    keys = list(self._pending)[:self.batch_size]
+                    if not keys:
+                        return
+                    batch = {key: self._pending.pop(key) for key in keys}
+                    self._inflight = set(keys)
+                try:
+                    self._write(batch)
+                finally:
+                    with self._lock:
+                        self._inflight = set()
+
+    def stats(self):
+        """Returns the buffer metrics as a dict."""
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def start(self):
+        """Start the background flusher thread once."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='vote-buffer', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Vote buffer flush failed')
+            finally:
+                close_old_connections()
+
+    def _write(self, batch):
+        """Write one batch of ballots with bulk queries."""
+        oldest = min(queued_at for _, queued_at in batch.values())
+        dropped = 0
+        try:
+            self._bulk_write(batch)
+        except DatabaseError:
+            logger.warning('Bulk vote write failed, writing %d ballots one by one',
+                           len(batch), exc_info=True)
+            dropped = self._write_each(batch)
+        lag = time.monotonic() - oldest
+        with self._lock:
+            self._stats['flushed'] += len(batch) - dropped
+            self._stats['dropped'] += dropped
+            self._stats['batches'] += 1
+            self._stats['last_batch_size'] = len(batch)
+            self._stats['last_flush_lag'] = lag
+            self._stats['max_flush_lag'] = max(self._stats['max_flush_lag'], lag)
+        for question_id in {question_id for _, question_id in batch}:
+            bump_results_version(question_id)
+
+    def _bulk_write(self, batch):
+        user_ids = {user_id for user_id, _ in batch}
+        question_ids = {question_id for _, question_id in batch}
+        deltas = defaultdict(int)
+        events = []
+        now, clock = timezone.now(), time.monotonic()
+        with transaction.atomic():
+            existing = {
+                (vote.user_id, vote.question_id): vote
+                for vote in Vote.objects.select_for_update()
+                .filter(user_id__in=user_ids, question_id__in=question_ids)
+                .only('pk', 'user_id', 'question_id', 'choice_id')}
+            created, changed = [], []
+            for (user_id, question_id), (choice_id, queued_at) in batch.items():
+                # Wall clock time of the submit, for the vote timestamps.
+                when = now - datetime.timedelta(seconds=clock - queued_at)
+                vote = existing.get((user_id, question_id))
+                if vote is None:
+                    created.append(Vote(user_id=user_id, question_id=question_id,
+                                        choice_id=choice_id, cast_at=when))
+                elif vote.choice_id != choice_id:
+                    deltas[vote.choice_id] -= 1
+                    events.append((question_id, vote.choice_id, when, -1))
+                    vote.moved_from = vote.choice_id
+                    vote.choice_id = choice_id
+                    vote.changed_at = when
+                    changed.append(vote)
+                else:
+                    continue
+                deltas[choice_id] += 1
+                events.append((question_id, choice_id, when, 1))
+            Vote.objects.bulk_create(created, batch_size=self.batch_size)
+            Vote.objects.bulk_update(changed, ['choice', 'changed_at', 'moved_from'], batch_size=self.batch_size)
+            record_vote_events(events)
+            by_delta = defaultdict(list)
+            for choice_id, delta in deltas.items():
+                if delta:
+                    by_delta[delta].append(choice_id)
+            for delta, choice_ids in by_delta.items():
+                Choice.objects.filter(pk__in=choice_ids).update(
+                    vote_count=F('vote_count') + delta)
+
+    def _write_each(self, batch):
+        """Write ballots one at a time, returns the number of dropped ones."""
+        choices = Choice.objects.in_bulk([choice_id for choice_id, _ in batch.values()])
+        dropped = 0
+        for (user_id, _), (choice_id, _) in batch.items():
+            try:
+                cast_vote(User(pk=user_id), choices[choice_id])
+            except (DatabaseError, KeyError):
+                logger.exception('Dropped buffered vote of user %s', user_id)
+                dropped += 1
+        return dropped
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_vote_buffer():
+    """Returns the running vote buffer of this process."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VoteBuffer(
+                batch_size=settings.POLLS_VOTE_BUFFER_BATCH_SIZE,
+                flush_interval=settings.POLLS_VOTE_BUFFER_FLUSH_INTERVAL,
+                max_pending=settings.POLLS_VOTE_BUFFER_MAX_PENDING)
+            _buffer.start()
+    return _buffer
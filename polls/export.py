@@ -0,0 +1,124 @@
+"""Streaming CSV and NDJSON export of votes and per-question tallies.
+
+Rows are read with QuerySet.iterator, a server-side cursor where the
+database supports one, and encoded one line at a time, so memory use
+does not grow with the number of votes.
+"""
+import csv
+import datetime
+import json
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from polls.models import Choice, Vote
+
+VOTE_COLUMNS = ['id', 'user_id', 'username', 'question_id', 'choice_id', 'choice_text',
+                'cast_at', 'changed_at']
+TALLY_COLUMNS = ['question_id', 'question_text', 'choice_id', 'choice_text', 'votes']
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def filter_questions(queryset, question_ids=None, since=None, until=None,
+                     date_field='question__pub_date'):
+    """Narrow a queryset of rows related to a question.
+
+    Args:
+        queryset: Vote or Choice queryset.
+        question_ids: Only these questions when given.
+        since: Only rows whose date_field is at or after this datetime.
+        until: Only rows whose date_field is before this datetime.
+        date_field: Field compared with since and until, the publication
+            date of the question by default.
+    """
+    if question_ids is not None:
+        queryset = queryset.filter(question_id__in=question_ids)
+    if since is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{date_field}__lt': until})
+    return queryset
+
+
+def vote_rows(chunk_size=2000, **filters):
+    """Yield one tuple of VOTE_COLUMNS per vote, see filter_questions.
+
+    since and until apply to the time the vote was cast.
+    """
+    votes = filter_questions(Vote.objects.all(), date_field='cast_at', **filters)
+    return (votes.order_by('pk')
+            .values_list('pk', 'user_id', 'user__username', 'question_id',
+                         'choice_id', 'choice__choice_text', 'cast_at', 'changed_at')
+            .iterator(chunk_size=chunk_size))
+
+
+def tally_rows(chunk_size=2000, **filters):
+    """Yield one tuple of TALLY_COLUMNS per choice, see filter_questions."""
+    choices = filter_questions(Choice.objects.all(), **filters)
+    return (choices.order_by('question_id', 'pk')
+            .values_list('question_id', 'question__question_text', 'pk',
+                         'choice_text', 'vote_count')
+            .iterator(chunk_size=chunk_size))
+
+
+class _Echo:
+    """File-like object whose write returns the written line."""
+
+    def write(self, value):
+        return value
+
+
+def parse_when(value):
+    """Returns an aware datetime from an ISO date or datetime string.
+
+    Raises:
+        ValueError: value is neither.
+    """
+    when = parse_datetime(value)
+    if when is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date {value!r}')
+        when = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(when):
+        when = timezone.make_aware(when)
+    return when
+
+
+def encode_csv(columns, rows):
+    """Yield the CSV lines of rows, header first."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def encode_ndjson(columns, rows):
+    """Yield one JSON object per row, one per line."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=str) + '\n'
+
+
+def encode(fmt, columns, rows):
+    """Yield the lines of rows in fmt, 'csv' or 'ndjson'."""
+    if fmt == 'csv':
+        return encode_csv(columns, rows)
+    if fmt == 'ndjson':
+        return encode_ndjson(columns, rows)
+    raise ValueError(f'Unknown export format {fmt!r}')
+
+
+def export_response(kind, fmt, **filters):
+    """Returns a StreamingHttpResponse with the export as an attachment.
+
+    Args:
+        kind: 'votes' for one row per vote, 'tallies' for one per choice.
+        fmt: 'csv' or 'ndjson'.
+        filters: Passed to filter_questions.
+    """
+    if kind == 'votes':
+        lines = encode(fmt, VOTE_COLUMNS, vote_rows(**filters))
+    else:
+        lines = encode(fmt, TALLY_COLUMNS, tally_rows(**filters))
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
@@ -0,0 +1,66 @@
+import math
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+from polls.models import Question
+
+INDEX_FRAGMENT_KEY = 'polls:index:fragment'
+
+
+def next_index_boundary(questions, now):
+    """Returns the next time the index list changes by itself, or None.
+
+    That is the next pub_date of any question, when it gets listed, or
+    the next end_date of a listed question, when it closes.
+    """
+    boundaries = [question.end_date for question in questions
+                  if question.end_date is not None and question.end_date > now]
+    next_pub = (Question.objects.filter(pub_date__gt=now)
+                .aggregate(next_pub=Min('pub_date'))['next_pub'])
+    if next_pub is not None:
+        boundaries.append(next_pub)
+    return min(boundaries, default=None)
+
+
+def get_index_fragment(questions):
+    """Returns the rendered question list of the index page.
+
+    The fragment holds nothing specific to a user. It is cached until the
+    next time boundary of the listed questions, at most
+    settings.POLLS_INDEX_CACHE_TIMEOUT seconds, and dropped whenever a
+    Question is saved or deleted (see polls.signals).
+
+    Args:
+        questions: Lazy queryset of the listed questions, only evaluated
+            when the fragment is not cached.
+    """
+    html = cache.get(INDEX_FRAGMENT_KEY)
+    if html is None:
+        now = timezone.now()
+        questions = list(questions)
+        html = render_to_string(
+            'polls/question_list.html', {'latest_question_list': questions})
+        timeout = settings.POLLS_INDEX_CACHE_TIMEOUT
+        boundary = next_index_boundary(questions, now)
+        if boundary is not None:
+            until = math.ceil((boundary - now).total_seconds())
+            timeout = max(1, min(timeout, until))
+        cache.set(INDEX_FRAGMENT_KEY, html, timeout)
+    return mark_safe(html)
+
+
+async def aget_index_fragment(questions):
+    """Async get_index_fragment, a cache hit needs no thread hop."""
+    html = await cache.aget(INDEX_FRAGMENT_KEY)
+    if html is None:
+        return await sync_to_async(get_index_fragment)(questions)
+    return mark_safe(html)
+
+
+def invalidate_index_fragment():
+    """Drops the cached question list of the index page."""
+    cache.delete(INDEX_FRAGMENT_KEY)
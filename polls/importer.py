@@ -0,0 +1,215 @@
+"""Streaming readers and a batched writer for bulk imports.
+
+Used by the import_polls management command. Records use the fixture
+shape of data/*.json: {"model": ..., "pk": ..., "fields": {...}}.
+"""
+import csv
+import functools
+import json
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from polls.fragments import invalidate_index_fragment
+from polls.models import Choice, Question
+from polls.results import bump_results_version, refresh_ballot_tally
+from polls.rollups import rebuild_rollups
+
+# Models that can be imported, in the order their batches are written.
+IMPORT_ORDER = ['auth.user', 'polls.question', 'polls.choice', 'polls.vote', 'polls.ballot']
+# Primary keys per lookup query, below the SQLite parameter limit.
+LOOKUP_SIZE = 900
+
+
+def iter_json_array(stream, chunk_size=65536):
+    """Yield the items of a top level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    chunks = iter(functools.partial(stream.read, chunk_size), '')
+    buffer, pos = _array_start(chunks)
+    while True:
+        pos = _skip_separators(buffer, pos)
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The item is cut by the end of the chunk, or the array by
+            # the end of the file.
+            chunk = next(chunks, None)
+            if chunk is None:
+                if buffer[pos:].strip():
+                    raise
+                raise ValueError('Unterminated JSON array')
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+
+
+def _array_start(chunks):
+    """Returns the buffer and the position after the opening bracket."""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        pos = _skip_separators(buffer, 0, ' \t\r\n')
+        if pos < len(buffer):
+            if buffer[pos] != '[':
+                raise ValueError('Expected a JSON array')
+            return buffer, pos + 1
+    raise ValueError('Expected a JSON array')
+
+
+def _skip_separators(buffer, pos, separators=' \t\r\n,'):
+    while pos < len(buffer) and buffer[pos] in separators:
+        pos += 1
+    return pos
+
+
+def iter_ndjson(stream):
+    """Yield one record per non-empty line."""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(stream, model):
+    """Yield records from CSV rows of one model, with a pk column."""
+    for row in csv.DictReader(stream):
+        pk = row.pop('pk', None) or None
+        fields = {name: (value if value != '' else None) for name, value in row.items()}
+        yield {'model': model, 'pk': pk, 'fields': fields}
+
+
+class BatchImporter:
+    """Collect records per model and write them with bulk_create.
+
+    Every flush writes all pending batches in one transaction, parents
+    first. Records whose primary key already exists are skipped, so an
+    import can be run again from its last checkpoint; any other invalid
+    row aborts the batch. bulk_create sends no signals, so finish must
+    be called once the last batch is written.
+
+    Attributes:
+        batch_size (int): Records kept before a flush.
+        read (int): Records read and flushed so far.
+        inserted (int): Rows written so far.
+        skipped (int): Records skipped because their row exists.
+    """
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self._pending = {label: [] for label in IMPORT_ORDER}
+        self._count = 0
+        self._models = set()
+        self._question_ids = set()
+        self._voted_ids = set()
+        self._ballot_ids = set()
+
+    def add(self, record):
+        """Queue one record, returns True when a flush is due."""
+        label = record['model'].lower()
+        if label not in self._pending:
+            raise ValueError(f'Cannot import model {record["model"]!r}')
+        self._pending[label].append(self._build(label, record))
+        self._count += 1
+        return self._count >= self.batch_size
+
+    def flush(self):
+        """Write the pending records in one transaction."""
+        with transaction.atomic():
+            self._fill_vote_questions()
+            for label in IMPORT_ORDER:
+                if self._pending[label]:
+                    self._write(self._pending[label])
+                self._pending[label] = []
+        self.read += self._count
+        self._count = 0
+
+    def finish(self):
+        """Catch up on what loaddata and the signals do for written rows.
+
+        Resets the primary key sequences of the imported models, which
+        explicit pks leave behind on PostgreSQL, rebuilds the rollups of
+        the questions that got votes and invalidates the cached results
+        of every imported question and the index page.
+        """
+        statements = connection.ops.sequence_reset_sql(no_style(), list(self._models))
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        if self._voted_ids:
+            rebuild_rollups(self._voted_ids, batch_size=self.batch_size)
+        for question_id in self._question_ids - self._ballot_ids:
+            bump_results_version(question_id)
+        for question_id in self._ballot_ids:
+            refresh_ballot_tally(question_id)
+        if self._question_ids:
+            invalidate_index_fragment()
+
+    def _fill_vote_questions(self):
+        """Set the question of votes that only name their choice.
+
+        The choice may be in this batch, so pending choices are looked at
+        before the database.
+        """
+        votes = [vote for vote in self._pending['polls.vote'] if vote.question_id is None]
+        if not votes:
+            return
+        questions = {choice.pk: choice.question_id for choice in self._pending['polls.choice']}
+        missing = list({vote.choice_id for vote in votes} - questions.keys())
+        for start in range(0, len(missing), LOOKUP_SIZE):
+            questions.update(Choice.objects.filter(pk__in=missing[start:start + LOOKUP_SIZE])
+                             .values_list('pk', 'question_id'))
+        for vote in votes:
+            if vote.choice_id not in questions:
+                raise ValueError(f'Vote for unknown choice {vote.choice_id}')
+            vote.question_id = questions[vote.choice_id]
+
+    def _write(self, objects):
+        """Insert the objects whose primary key is not taken yet."""
+        model = type(objects[0])
+        pks = [obj.pk for obj in objects if obj.pk is not None]
+        existing = set()
+        for start in range(0, len(pks), LOOKUP_SIZE):
+            existing.update(model.objects.filter(pk__in=pks[start:start + LOOKUP_SIZE])
+                            .values_list('pk', flat=True))
+        new = [obj for obj in objects if obj.pk is None or obj.pk not in existing]
+        model.objects.bulk_create(new, batch_size=self.batch_size)
+        self.inserted += len(new)
+        self.skipped += len(objects) - len(new)
+        if new:
+            self._track(model, new)
+
+    def _track(self, model, objects):
+        """Remember the questions touched by written rows, see finish."""
+        self._models.add(model)
+        if model is Question:
+            ids = {obj.pk for obj in objects}
+        elif model._meta.label_lower in ('polls.choice', 'polls.vote', 'polls.ballot'):
+            ids = {obj.question_id for obj in objects}
+        else:
+            return
+        ids.discard(None)
+        self._question_ids |= ids
+        if model._meta.label_lower == 'polls.vote':
+            self._voted_ids |= ids
+        elif model._meta.label_lower == 'polls.ballot':
+            self._ballot_ids |= ids
+
+    @staticmethod
+    def _build(label, record):
+        model = apps.get_model(label)
+        values = {}
+        for name, value in record['fields'].items():
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                continue
+            if field.is_relation:
+                values[field.attname] = None if value is None else field.target_field.to_python(value)
+            else:
+                values[field.attname] = field.to_python(value)
+        if record.get('pk') is not None:
+            values[model._meta.pk.attname] = model._meta.pk.to_python(record['pk'])
+        return model(**values)
@@ -0,0 +1,112 @@
+import os
+import tempfile
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from polls import benchmark
+
+
+class Command(BaseCommand):
+    """Seed a throwaway database and load test the polls views."""
+
+    help = ('Benchmark the index, detail, results and vote views on a '
+            'synthetic dataset and check their query budgets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=1000)
+        parser.add_argument('--choices', type=int, default=4)
+        parser.add_argument('--votes', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--asgi', action='store_true',
+                            help='Send the requests through the ASGI handler.')
+        parser.add_argument('--endpoints', nargs='+', default=list(benchmark.QUERY_BUDGETS),
+                            choices=list(benchmark.QUERY_BUDGETS))
+        parser.add_argument('--compare-sqlite', action='store_true',
+                            help='Also run each endpoint with the stock SQLite setup, '
+                                 'rollback journal and deferred transactions.')
+        parser.add_argument('--compare-sessions', action='store_true',
+                            help='Also run each endpoint with database sessions and '
+                                 'uncached users, and with signed cookie sessions.')
+        parser.add_argument('--admission', action='store_true',
+                            help='Keep the vote rate limits and concurrency cap on, '
+                                 'rejected votes count as errors.')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        if connection.vendor == 'sqlite':
+            # Threads need a file database, the shared in-memory one
+            # locks whole tables.
+            settings_dict['TEST']['NAME'] = os.path.join(
+                tempfile.mkdtemp(), 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cache.clear()
+            dataset = benchmark.seed(
+                options['questions'], options['choices'],
+                options['votes'], options['users'])
+            self.stdout.write(
+                f"{'endpoint':<20}{'requests':>9}{'req/s':>9}{'p50 ms':>9}"
+                f"{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'budget':>8}{'errors':>8}")
+            over_budget = []
+            run = benchmark.run_async if options['asgi'] else benchmark.run
+            setups = self._database_setups(options, settings_dict)
+            admission = self._admission(options)
+            sessions = self._session_setups(options)
+            for endpoint in options['endpoints']:
+                for label, db_options in setups:
+                    connection.close()
+                    settings_dict['OPTIONS'] = db_options
+                    connection.ensure_connection()
+                    for session_label, overrides in sessions:
+                        with override_settings(**admission, **overrides):
+                            row = run(endpoint, dataset, options['requests'], options['concurrency'])
+                        name = endpoint + label + session_label
+                        self._write_row(name, row)
+                        if row['max_queries'] is not None and row['max_queries'] > row['budget']:
+                            over_budget.append(name)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        if over_budget:
+            raise CommandError(f"Query budget exceeded by: {', '.join(over_budget)}")
+
+    def _database_setups(self, options, settings_dict):
+        """Returns (label, database OPTIONS) pairs to run each endpoint with."""
+        setups = [('', settings_dict.get('OPTIONS', {}))]
+        if options['compare_sqlite'] and connection.vendor == 'sqlite':
+            setups = [('/stock', {'pragmas': {'journal_mode': 'DELETE'}}),
+                      ('/tuned', setups[0][1])]
+        return setups
+
+    def _admission(self, options):
+        """Returns the settings that turn admission control off, unless kept."""
+        if options['admission']:
+            return {}
+        # Every client votes far faster than a person would.
+        return {'POLLS_VOTE_USER_RATE': 0, 'POLLS_VOTE_IP_RATE': 0,
+                'POLLS_VOTE_MAX_CONCURRENCY': 0}
+
+    def _session_setups(self, options):
+        """Returns (label, settings) pairs of the session setups to compare."""
+        if not options['compare_sessions']:
+            return [('', {})]
+        return [
+            ('/db', {'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+                     'AUTH_USER_CACHE_TIMEOUT': 0}),
+            ('/cached', {'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+                         'AUTH_USER_CACHE_TIMEOUT': 300}),
+            ('/cookie', {'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies'}),
+        ]
+
+    def _write_row(self, name, row):
+        queries = '-' if row['max_queries'] is None else row['max_queries']
+        self.stdout.write(
+            f"{name:<20}{row['requests']:>9}{row['throughput']:>9.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+            f"{queries:>9}{row['budget']:>8}{row['errors']:>8}")
@@ -0,0 +1,108 @@
+import time
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from polls.models import Ballot, Choice, Question
+from polls.tally import approval, ballot_matrix, instant_runoff, load_ballots
+
+
+def random_ballots(ballots, choices, rng):
+    """Returns rank rows of ballots with skewed preferences.
+
+    Choices are ranked by popularity plus Gumbel noise and every ballot
+    ranks a random number of them.
+    """
+    popularity = np.log(np.linspace(1.0, 0.2, choices))
+    scores = popularity + rng.gumbel(size=(ballots, choices))
+    order = np.argsort(-scores, axis=1)
+    lengths = rng.integers(1, choices + 1, size=ballots)
+    return np.where(np.arange(choices) < lengths[:, None], order, -1).astype(np.int32)
+
+
+def seed_ballots(ranks, batch_size=10000):
+    """Store rank rows as the Ballot rows of a new ranked question.
+
+    Returns:
+        Tuple of the question id and its choice ids.
+    """
+    question = Question.objects.create(
+        question_text='Benchmark tally', pub_date=timezone.now(), kind=Question.RANKED)
+    choices = Choice.objects.bulk_create(
+        [Choice(question=question, choice_text=f'Choice {j}') for j in range(ranks.shape[1])])
+    choice_ids = np.array([choice.pk for choice in choices])
+    User.objects.bulk_create(
+        [User(username=f'tally-{i}', password='!') for i in range(len(ranks))],
+        batch_size=batch_size)
+    user_ids = User.objects.filter(username__startswith='tally-').values_list('pk', flat=True)
+    Ballot.objects.bulk_create(
+        (Ballot(user_id=user_id, question=question,
+                choice_ids=choice_ids[row[row >= 0]].tolist())
+         for user_id, row in zip(user_ids.iterator(), ranks)),
+        batch_size=batch_size)
+    return question.pk, choice_ids.tolist()
+
+
+class Command(BaseCommand):
+    """Time the ranked-choice and approval tally engine on random ballots."""
+
+    help = 'Benchmark polls.tally on synthetic ranked ballots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ballots', type=int, default=1000000)
+        parser.add_argument('--choices', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--from-lists', action='store_true',
+            help='Also time building the rank matrix from lists of choice '
+                 'ids, as read from the Ballot table.')
+        parser.add_argument(
+            '--database', action='store_true',
+            help='Store the ballots in a throwaway database and also time '
+                 'loading them, as a tally in the background does.')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        choices = options['choices']
+        ranks = random_ballots(options['ballots'], choices, rng)
+        self.stdout.write(f"{options['ballots']} ballots, {choices} choices")
+
+        if options['from_lists']:
+            rows = [[int(index) + 1 for index in row if index >= 0] for row in ranks]
+            start = time.perf_counter()
+            ranks = ballot_matrix(rows, list(range(1, choices + 1)))
+            self.stdout.write(f'rank matrix: {time.perf_counter() - start:.2f} s')
+
+        if options['database']:
+            ranks = self._load(ranks)
+
+        start = time.perf_counter()
+        rounds, winner = instant_runoff(ranks, choices)
+        elapsed = time.perf_counter() - start
+        for number, round_ in enumerate(rounds, start=1):
+            counts = ' '.join(f'{count:>8}' for count in round_['counts'])
+            self.stdout.write(f'round {number:>2}: {counts}  exhausted {round_["exhausted"]}')
+        self.stdout.write(f'instant-runoff: winner {winner}, {len(rounds)} rounds, {elapsed:.2f} s')
+
+        start = time.perf_counter()
+        approval(ranks, choices)
+        self.stdout.write(f'approval: {time.perf_counter() - start:.2f} s')
+
+    def _load(self, ranks):
+        """Returns ranks after a round trip through the Ballot table."""
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            start = time.perf_counter()
+            question_id, choice_ids = seed_ballots(ranks)
+            self.stdout.write(f'seed ballots: {time.perf_counter() - start:.2f} s')
+            start = time.perf_counter()
+            ranks = load_ballots(question_id, choice_ids)
+            self.stdout.write(f'load ballots: {time.perf_counter() - start:.2f} s')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        return ranks
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from polls.export import TALLY_COLUMNS, VOTE_COLUMNS, encode, parse_when, tally_rows, vote_rows
+
+
+class Command(BaseCommand):
+    """Stream votes, or per-choice tallies, to a CSV or NDJSON file."""
+
+    help = 'Export votes or tallies as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'], default='csv',
+            help='Output format.')
+        parser.add_argument(
+            '--tallies', action='store_true',
+            help='Export one row per choice with its tally instead of votes.')
+        parser.add_argument(
+            '--question', type=int, action='append', dest='questions',
+            help='Only this question, may be repeated.')
+        parser.add_argument(
+            '--since', help='Only votes cast, or with --tallies questions '
+                            'published, on or after this date.')
+        parser.add_argument(
+            '--until', help='Only votes cast, or with --tallies questions '
+                            'published, before this date.')
+        parser.add_argument(
+            '--output', help='Output file, standard output by default.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, **options):
+        try:
+            since = options['since'] and parse_when(options['since'])
+            until = options['until'] and parse_when(options['until'])
+        except ValueError as error:
+            raise CommandError(error) from error
+        filters = {'question_ids': options['questions'], 'since': since or None,
+                   'until': until or None, 'chunk_size': options['chunk_size']}
+        if options['tallies']:
+            lines = encode(options['format'], TALLY_COLUMNS, tally_rows(**filters))
+        else:
+            lines = encode(options['format'], VOTE_COLUMNS, vote_rows(**filters))
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,110 @@
+import os
+import time
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from polls.importer import BatchImporter, iter_csv, iter_json_array, iter_ndjson
+
+
+class Command(BaseCommand):
+    """Stream users, questions, choices and votes into the database.
+
+    Unlike loaddata the input is never read whole: records are parsed one
+    at a time and written with bulk_create, one transaction per batch.
+    After each batch the number of records read is saved to a checkpoint
+    file, so a crashed import continues with --resume. Sequences, rollups
+    and cached results are brought up to date once every batch is in;
+    after a resumed import only for the records of the last run, so run
+    rollup_votes when a crashed run had already written votes.
+    """
+
+    help = 'Bulk import polls data from JSON, NDJSON or CSV files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import.')
+        parser.add_argument(
+            '--format', choices=['json', 'ndjson', 'csv'],
+            help='Input format, guessed from the file extension by default.')
+        parser.add_argument(
+            '--model',
+            help='Model label of the CSV rows, such as polls.question.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Records written per transaction.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file, PATH.checkpoint by default.')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip the records saved by the last checkpoint.')
+        parser.add_argument(
+            '--no-reconcile', action='store_true',
+            help='Do not recount the vote tallies after the import.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('json', 'ndjson', 'csv'):
+            raise CommandError(f'Cannot guess the format of {path}, use --format.')
+        if fmt == 'csv' and not options['model']:
+            raise CommandError('CSV imports need --model.')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        skip = self._read_checkpoint(checkpoint) if options['resume'] else 0
+
+        importer = BatchImporter(batch_size=options['batch_size'])
+        start = time.perf_counter()
+        with open(path, newline='' if fmt == 'csv' else None, encoding='utf-8') as stream:
+            try:
+                self._import(self._records(stream, fmt, options['model']), importer,
+                             skip, checkpoint, start)
+            except (ValueError, LookupError, FieldDoesNotExist, ValidationError,
+                    IntegrityError) as error:
+                raise CommandError(
+                    f'Batch after record {skip + importer.read}: {error}') from error
+
+        if not options['no_reconcile']:
+            call_command('reconcile_votes', stdout=self.stdout)
+        importer.finish()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.inserted} records, skipped {importer.skipped} '
+            f'already present ({self._rate(importer, start):.0f} rows/s).'))
+
+    def _read_checkpoint(self, checkpoint):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as f:
+            skip = int(f.read().strip() or 0)
+        self.stdout.write(f'Resuming after {skip} records.')
+        return skip
+
+    @staticmethod
+    def _records(stream, fmt, model):
+        if fmt == 'json':
+            return iter_json_array(stream)
+        if fmt == 'ndjson':
+            return iter_ndjson(stream)
+        return iter_csv(stream, model)
+
+    def _import(self, records, importer, skip, checkpoint, start):
+        for index, record in enumerate(records):
+            if index < skip:
+                continue
+            if importer.add(record):
+                self._flush(importer, skip, checkpoint, start)
+        self._flush(importer, skip, checkpoint, start)
+
+    def _flush(self, importer, skip, checkpoint, start):
+        importer.flush()
+        with open(checkpoint, 'w') as f:
+            f.write(str(skip + importer.read))
+        self.stdout.write(
+            f'{skip + importer.read} records '
+            f'({self._rate(importer, start):.0f} rows/s)')
+
+    @staticmethod
+    def _rate(importer, start):
+        elapsed = time.perf_counter() - start
+        return importer.read / elapsed if elapsed else 0.0
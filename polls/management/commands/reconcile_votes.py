@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Q
+from polls.models import Choice
+from polls.results import bump_results_version
+
+
+class Command(BaseCommand):
+    """Compare Choice.vote_count with the Vote table and repair any drift."""
+
+    help = 'Recount the materialized vote tallies from the Vote table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report drifted choices, do not update them.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of choices updated per query.')
+
+    def handle(self, *args, **options):
+        # Questions with archived votes keep their tallies, see polls.snapshots.
+        live = Q(question__snapshot__isnull=True) | Q(question__snapshot__votes_archived_at__isnull=True)
+        drifted = (Choice.objects.filter(live).annotate(actual=Count('vote'))
+                   .exclude(vote_count=F('actual'))
+                   .only('pk', 'question_id', 'vote_count'))
+        fixed = []
+        for choice in drifted.iterator():
+            self.stdout.write(
+                f'Choice {choice.pk}: tally {choice.vote_count}, '
+                f'counted {choice.actual}')
+            choice.vote_count = choice.actual
+            fixed.append(choice)
+        if fixed and not options['dry_run']:
+            with transaction.atomic():
+                Choice.objects.bulk_update(
+                    fixed, ['vote_count'], batch_size=options['batch_size'])
+            # bulk_update sends no signals, closed polls are cached for good.
+            for question_id in {choice.question_id for choice in fixed}:
+                bump_results_version(question_id)
+        action = 'found' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(fixed)} drifted choice tallies {action}.'))
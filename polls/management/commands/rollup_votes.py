@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from polls.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    """Recompute the turnout rollups from the Vote table."""
+
+    help = 'Rebuild the per-minute, per-hour and per-day vote rollups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--question', type=int, action='append', dest='questions',
+            help='Only rebuild this question, may be repeated.')
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Number of votes read per query.')
+
+    def handle(self, *args, **options):
+        read = rebuild_rollups(options['questions'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {read} votes.'))
@@ -0,0 +1,28 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from polls.snapshots import archive_votes, snapshot_closed_questions
+
+
+class Command(BaseCommand):
+    """Freeze the results of closed polls, meant to run periodically."""
+
+    help = ('Write result snapshots of closed polls and optionally archive '
+            'the votes of old closed polls.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive-after', type=int, metavar='DAYS',
+            help='Move the votes of polls closed more than DAYS days ago '
+                 'to the archive table.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Questions snapshotted, or votes archived, per transaction.')
+
+    def handle(self, *args, **options):
+        written = snapshot_closed_questions(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{written} result snapshots written.'))
+        if options['archive_after'] is not None:
+            closed_before = timezone.now() - datetime.timedelta(days=options['archive_after'])
+            moved = archive_votes(closed_before, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{moved} votes archived.'))
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.5 on 2026-10-18 17:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_vote_count(apps, schema_editor):
+    """Populate the new tally from the existing Vote rows."""
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    counts = (Vote.objects.filter(choice=OuterRef('pk'))
+              .order_by().values('choice')
+              .annotate(total=Count('pk')).values('total'))
+    Choice.objects.update(vote_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_remove_choice_votes_vote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='choice',
+            name='vote_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_vote_count, migrations.RunPython.noop),
+    ]
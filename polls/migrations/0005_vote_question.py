@@ -0,0 +1,65 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_question_and_dedupe(apps, schema_editor):
+    """Copy the question from each choice and keep one vote per question.
+
+    When a user has several votes on a question, the most recent one (the
+    highest id) wins, as it did in the old vote view.
+    """
+    Choice = apps.get_model('polls', 'Choice')
+    Vote = apps.get_model('polls', 'Vote')
+    questions = Choice.objects.filter(pk=OuterRef('choice_id')).values('question_id')
+    Vote.objects.update(question_id=Subquery(questions))
+
+    duplicates = []
+    previous = None
+    votes = (Vote.objects.order_by('user_id', 'question_id', '-pk')
+             .values_list('pk', 'user_id', 'question_id'))
+    for pk, user_id, question_id in votes.iterator():
+        if (user_id, question_id) == previous:
+            duplicates.append(pk)
+        previous = (user_id, question_id)
+    for start in range(0, len(duplicates), 500):
+        Vote.objects.filter(pk__in=duplicates[start:start + 500]).delete()
+
+    if duplicates:
+        counts = (Vote.objects.filter(choice=OuterRef('pk'))
+                  .order_by().values('choice')
+                  .annotate(total=Count('pk')).values('total'))
+        Choice.objects.update(vote_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    # The data step commits on its own: on PostgreSQL the UPDATE of the
+    # deferred foreign key leaves trigger events pending, and ALTER TABLE
+    # refuses to run in the same transaction.
+    atomic = False
+
+    dependencies = [
+        ('polls', '0004_choice_vote_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.RunPython(fill_question_and_dedupe, migrations.RunPython.noop, atomic=True),
+        migrations.AlterField(
+            model_name='vote',
+            name='question',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question'),
+        ),
+        migrations.AddConstraint(
+            model_name='vote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_vote_per_question'),
+        ),
+    ]
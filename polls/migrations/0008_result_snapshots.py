@@ -0,0 +1,35 @@
+# Generated by Django 4.0.5 on 2026-10-18 17:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0007_question_pub_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField()),
+                ('question_id', models.BigIntegerField(db_index=True)),
+                ('choice_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResultSnapshot',
+            fields=[
+                ('question', models.OneToOneField(
+                    on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                    related_name='snapshot', serialize=False, to='polls.question')),
+                ('closed_at', models.DateTimeField()),
+                ('total', models.IntegerField()),
+                ('choices', models.JSONField()),
+                ('votes_archived_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('polls', '0008_result_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='kind',
+            field=models.CharField(
+                choices=[('single', 'Single choice'), ('ranked', 'Ranked choice'), ('approval', 'Approval')],
+                default='single', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='resultsnapshot',
+            name='rounds',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='resultsnapshot',
+            name='winner',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Ballot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choice_ids', models.JSONField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='polls.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ballot',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_ballot_per_question'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0010_vote_timestamps_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedvote',
+            name='cast_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedvote',
+            name='changed_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0011_archived_vote_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='moved_from',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
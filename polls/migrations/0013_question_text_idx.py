@@ -0,0 +1,17 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0012_vote_moved_from'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['question_text'], name='question_text_idx'),
+        ),
+    ]
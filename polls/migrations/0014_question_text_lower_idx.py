@@ -0,0 +1,22 @@
+# Generated by Django 4.0.5 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0013_question_text_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_text_idx',
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(django.db.models.functions.text.Lower('question_text'), name='question_text_lower_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 import datetime
 from django.db import models
+from django.db.models import ExpressionWrapper, Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -7,6 +9,35 @@ from django.contrib.auth.models import User
 # Create your models here.
 
 
+class QuestionQuerySet(models.QuerySet):
+    """QuerySet of Question with filters computed in SQL."""
+
+    def published(self):
+        """Returns the questions whose pub_date has passed."""
+        return self.filter(pub_date__lte=timezone.now())
+
+    def open(self):
+        """Returns the questions that can be voted on now."""
+        now = timezone.now()
+        return self.filter(Q(pub_date__lte=now), Q(end_date__isnull=True) | Q(end_date__gte=now))
+
+    def closed(self):
+        """Returns the questions whose end_date has passed."""
+        return self.filter(end_date__lt=timezone.now())
+
+    def upcoming(self):
+        """Returns the questions that are not published yet."""
+        return self.filter(pub_date__gt=timezone.now())
+
+    def with_is_open(self):
+        """Annotates is_open, the SQL counterpart of Question.can_vote."""
+        now = timezone.now()
+        is_open = Q(pub_date__lte=now) & (
+            Q(end_date__isnull=True) | Q(end_date__gte=now))
+        return self.annotate(
+            is_open=ExpressionWrapper(is_open, output_field=models.BooleanField()))
+
+
 class Question(models.Model):
     """Question class
 
@@ -14,6 +45,8 @@ class Question(models.Model):
         question_text: string
         pub_date: datetime
         end_date: datetime
+        kind: SINGLE (one choice, Vote), RANKED (instant-runoff, Ballot)
+            or APPROVAL (any number of choices, Ballot)
 
     Methods:
         was_published_recently (bool): show question was published recently.
@@ -22,9 +55,32 @@ class Question(models.Model):
 
     """
 
+    SINGLE = 'single'
+    RANKED = 'ranked'
+    APPROVAL = 'approval'
+    KIND_CHOICES = [
+        (SINGLE, 'Single choice'),
+        (RANKED, 'Ranked choice'),
+        (APPROVAL, 'Approval'),
+    ]
+
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published')
     end_date = models.DateTimeField('ending date', null=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=SINGLE)
+
+    objects = QuestionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pub_date', 'end_date'],
+                         name='question_pub_end_idx'),
+            models.Index(fields=['pub_date', 'id'],
+                         name='question_pub_id_idx'),
+            # Case-insensitive prefix search of the admin, see QuestionAdmin.
+            models.Index(Lower('question_text'),
+                         name='question_text_lower_idx'),
+        ]
 
     def __str__(self) -> str:
         """Returns a string representation of this Question"""
@@ -45,6 +101,10 @@ class Question(models.Model):
             return self.pub_date < timezone.now()
         return self.pub_date <= timezone.now() <= self.end_date
 
+    def uses_ballots(self):
+        """Returns True if votes of this Question are Ballots, not Votes"""
+        return self.kind != self.SINGLE
+
 
 class Choice(models.Model):
     """Choice class
@@ -52,14 +112,17 @@ class Choice(models.Model):
     Attributes:
         question (Question): Question class that want this choice there.
         choice_text (str): Text of the choice.
+        vote_count (int): Materialized number of votes for this choice.
         votes (int): Number of votes in this question.
     """
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     choice_text = models.CharField(max_length=200)
+    vote_count = models.IntegerField(default=0)
 
     @property
     def votes(self):
-        return Vote.objects.filter(choice=self).count()
+        """Returns the tally kept by polls.voting, without a query."""
+        return self.vote_count
 
     def __str__(self) -> str:
         """Returns a string representation of this Choice"""
@@ -67,11 +130,147 @@ class Choice(models.Model):
 
 
 class Vote(models.Model, ):
+    """Vote class, one per user and question.
+
+    Attributes:
+        user (User): User who votes.
+        question (Question): Question of the selected choice.
+        choice (Choice): Choice selected by the user.
+        cast_at (datetime): When the user first voted on the question.
+        changed_at (datetime): When the vote last moved to another
+            choice, None if it never did.
+        moved_from (int): Id of the choice the vote last moved away
+            from, None if it never moved.
+    """
     user = models.ForeignKey(
         User, blank=False, null=False, on_delete=models.CASCADE)
+    question = models.ForeignKey(
+        Question, blank=False, null=False, on_delete=models.CASCADE)
     choice = models.ForeignKey(
         Choice, blank=False, null=False, on_delete=models.CASCADE)
+    cast_at = models.DateTimeField(default=timezone.now)
+    changed_at = models.DateTimeField(null=True, blank=True)
+    moved_from = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'question'], name='unique_vote_per_question'),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'choice'],
+                         name='vote_question_choice_idx'),
+        ]
 
     def __str__(self) -> str:
         """Returns a string representation of this Vote"""
         return f'{self.user} votes {self.choice}'
+
+
+class VoteRollup(models.Model):
+    """Net votes of a choice in one time bucket, see polls.rollups.
+
+    Attributes:
+        question (Question): Question of the choice.
+        choice (Choice): The choice.
+        granularity (str): MINUTE, HOUR or DAY.
+        bucket (datetime): Start of the bucket, in UTC.
+        count (int): Votes cast for the choice in the bucket, less the
+            votes moved away from it.
+    """
+    MINUTE = 'minute'
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [(MINUTE, 'Minute'), (HOUR, 'Hour'), (DAY, 'Day')]
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    granularity = models.CharField(max_length=6, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index of timeline reads, by question and granularity.
+            models.UniqueConstraint(
+                fields=['question', 'granularity', 'bucket', 'choice'],
+                name='unique_rollup_bucket'),
+        ]
+
+    def __str__(self) -> str:
+        """Returns a string representation of this VoteRollup"""
+        return f'{self.choice_id} {self.granularity} {self.bucket}: {self.count}'
+
+
+class Ballot(models.Model):
+    """Ballot of a ranked or approval question, one per user and question.
+
+    Attributes:
+        user (User): User who votes.
+        question (Question): The question.
+        choice_ids (list): Ids of the selected choices, most preferred
+            first on a ranked question.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    choice_ids = models.JSONField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'question'], name='unique_ballot_per_question'),
+        ]
+
+    def __str__(self) -> str:
+        """Returns a string representation of this Ballot"""
+        return f'{self.user} ballot {self.choice_ids}'
+
+
+class ResultSnapshot(models.Model):
+    """Final results of a closed question, written once by snapshot_results.
+
+    Attributes:
+        question (Question): The closed question.
+        closed_at (datetime): End date of the question.
+        total (int): Number of votes.
+        choices (list): Dicts with the id, text and votes of each choice.
+        rounds (list): Instant-runoff rounds of a ranked question.
+        winner (int): Id of the winning choice of a ranked or approval
+            question.
+        votes_archived_at (datetime): When the votes of the question were
+            moved to ArchivedVote, None while they are in Vote.
+    """
+    question = models.OneToOneField(
+        Question, primary_key=True, related_name='snapshot', on_delete=models.CASCADE)
+    closed_at = models.DateTimeField()
+    total = models.IntegerField()
+    choices = models.JSONField()
+    rounds = models.JSONField(default=list)
+    winner = models.BigIntegerField(null=True, blank=True)
+    votes_archived_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        """Returns a string representation of this ResultSnapshot"""
+        return f'Results of {self.question_id} closed at {self.closed_at}'
+
+
+class ArchivedVote(models.Model):
+    """Vote of a long closed question, moved out of the Vote table.
+
+    Attributes:
+        user_id (int): Id of the user who voted.
+        question_id (int): Id of the question.
+        choice_id (int): Id of the selected choice.
+        cast_at (datetime): When the vote was cast, None for votes
+            archived before it was kept.
+        changed_at (datetime): When the vote last moved to another choice.
+    """
+    user_id = models.BigIntegerField()
+    question_id = models.BigIntegerField(db_index=True)
+    choice_id = models.BigIntegerField()
+    cast_at = models.DateTimeField(null=True)
+    changed_at = models.DateTimeField(null=True)
+
+    def __str__(self) -> str:
+        """Returns a string representation of this ArchivedVote"""
+        return f'User {self.user_id} voted {self.choice_id}'
@@ -0,0 +1,102 @@
+import base64
+import binascii
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(question):
+    """Returns an opaque cursor pointing after question."""
+    raw = f'{question.pub_date.isoformat()}|{question.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns the (pub_date, pk) position of a cursor.
+
+    Raises:
+        ValueError: The cursor was not made by encode_cursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        pub_date, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        position = parse_datetime(pub_date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    if position[0] is None:
+        raise ValueError(f'Invalid cursor {cursor!r}')
+    return position
+
+
+def keyset_page(queryset, cursor=None, per_page=20):
+    """Returns one page of questions, newest first, and the next cursor.
+
+    The page is found by seeking on (pub_date, id) instead of OFFSET, so
+    every page costs the same no matter how deep it is.
+
+    Args:
+        queryset: Questions to paginate.
+        cursor: Cursor of the previous page, None for the first page.
+        per_page: Number of questions per page.
+
+    Returns:
+        Tuple of the list of questions and the cursor of the next page,
+        which is None on the last page.
+    """
+    queryset = queryset.order_by('-pub_date', '-pk')
+    if cursor:
+        pub_date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+    questions = list(queryset[:per_page + 1])
+    if len(questions) <= per_page:
+        return questions, None
+    questions = questions[:per_page]
+    return questions, encode_cursor(questions[-1])
+
+
+def estimate_count(model, using='default'):
+    """Returns a cheap estimate of the number of rows of model's table.
+
+    PostgreSQL and MySQL keep a row estimate in their statistics; other
+    databases use the largest primary key, one index lookup.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        else:
+            quote = connection.ops.quote_name
+            cursor.execute(
+                f'SELECT MAX({quote(model._meta.pk.column)}) FROM {quote(table)}')
+        row = cursor.fetchone()
+    return max(int(row[0] or 0), 0) if row else 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that does not count a large unfiltered table.
+
+    An unfiltered queryset whose table is estimated above threshold rows
+    reports the estimate as its count; anything else is counted exactly.
+
+    Attributes:
+        threshold (int): Smallest estimate that is trusted.
+    """
+
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where and not queryset.query.distinct:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate >= self.threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,166 @@
+"""Fan-out of live result tallies to Server-Sent Events streams.
+
+Tallies are computed once per change by publish_tallies and handed to
+every subscriber of the question. The broker class is pluggable through
+settings.POLLS_PUBSUB_BACKEND; InMemoryBroker only reaches the streams of
+its own process, a multi-process deployment needs a shared backend with
+the same interface.
+"""
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.utils.module_loading import import_string
+from polls.results import get_results
+
+
+class Subscription:
+    """Stream of tally deltas of one question for one viewer.
+
+    Deltas that arrive while the viewer is busy are merged, so a slow or
+    idle stream only ever holds the latest tallies.
+    """
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self._pending = None
+        self._ready = threading.Condition()
+
+    def put(self, delta):
+        """Merge delta into the pending message and wake the reader."""
+        with self._ready:
+            if self._pending is None:
+                self._pending = {'total': delta['total'], 'choices': dict(delta['choices'])}
+            else:
+                self._pending['total'] = delta['total']
+                self._pending['choices'].update(delta['choices'])
+            self._ready.notify()
+
+    def get(self, timeout=None):
+        """Returns the pending delta, or None after timeout seconds."""
+        with self._ready:
+            if self._pending is None:
+                self._ready.wait(timeout)
+            delta, self._pending = self._pending, None
+        return delta
+
+
+class BaseBroker:
+    """Interface of a tally broker."""
+
+    def subscribe(self, question_id):
+        """Returns a Subscription, or None when the connection cap is reached."""
+        raise NotImplementedError
+
+    def is_full(self):
+        """Returns True when subscribe would return None."""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def has_subscribers(self, question_id):
+        raise NotImplementedError
+
+    def publish(self, question_id, delta):
+        """Hand delta to every subscriber of question_id."""
+        raise NotImplementedError
+
+
+class InMemoryBroker(BaseBroker):
+    """Broker for the streams of the current process.
+
+    Attributes:
+        max_connections (int): Most open subscriptions in this process.
+    """
+
+    def __init__(self, max_connections=100):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._count = 0
+
+    def subscribe(self, question_id):
+        with self._lock:
+            if self._count >= self.max_connections:
+                return None
+            subscription = Subscription(question_id)
+            self._subscribers[question_id].add(subscription)
+            self._count += 1
+        return subscription
+
+    def is_full(self):
+        return self._count >= self.max_connections
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.question_id, set())
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+                self._count -= 1
+            if not subscribers:
+                self._subscribers.pop(subscription.question_id, None)
+
+    def has_subscribers(self, question_id):
+        return question_id in self._subscribers
+
+    def publish(self, question_id, delta):
+        with self._lock:
+            subscribers = list(self._subscribers.get(question_id, ()))
+        for subscription in subscribers:
+            subscription.put(delta)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+_last_tallies = {}
+_publish_lock = threading.Lock()
+
+
+def live_results_enabled():
+    """Returns whether results pages open a live results stream.
+
+    Off unless POLLS_LIVE_RESULTS is set, and always off under ASGI
+    (POLLS_ASYNC_VIEWS): Django 4.0 iterates streaming responses on the
+    event loop there, so a waiting stream would stall the worker.
+    """
+    return settings.POLLS_LIVE_RESULTS and not settings.POLLS_ASYNC_VIEWS
+
+
+def get_broker():
+    """Returns the broker of this process, see POLLS_PUBSUB_BACKEND."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            broker_class = import_string(settings.POLLS_PUBSUB_BACKEND)
+            _broker = broker_class(max_connections=settings.POLLS_SSE_MAX_CONNECTIONS)
+    return _broker
+
+
+def snapshot(results):
+    """Returns the tallies of a results dict as a message."""
+    return {
+        'total': results['total'],
+        'choices': {choice['id']: choice['votes'] for choice in results['choices']},
+    }
+
+
+def publish_tallies(question_id):
+    """Compute the tallies of a question once and send the changes.
+
+    Does nothing when nobody watches the question.
+    """
+    broker = get_broker()
+    if not broker.has_subscribers(question_id):
+        _last_tallies.pop(question_id, None)
+        return
+    results = get_results(question_id)
+    if results is None:
+        return
+    current = snapshot(results)
+    with _publish_lock:
+        previous = _last_tallies.get(question_id, {'choices': {}})
+        _last_tallies[question_id] = current
+    changed = {choice_id: votes for choice_id, votes in current['choices'].items()
+               if previous['choices'].get(choice_id) != votes}
+    if changed:
+        broker.publish(question_id, {'total': current['total'], 'choices': changed})
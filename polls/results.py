@@ -0,0 +1,335 @@
+import logging
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.dispatch import Signal
+from django.utils import timezone
+from polls.models import Choice, Question
+from polls.tally import tally_results
+
+logger = logging.getLogger(__name__)
+
+# Sent with question_id whenever the results of a question change.
+results_changed = Signal()
+
+
+def _version_key(question_id):
+    return f'polls:results:{question_id}:version'
+
+
+def _results_key(question_id, version):
+    return f'polls:results:{question_id}:{version}'
+
+
+def _modified_key(question_id):
+    return f'polls:results:{question_id}:modified'
+
+
+def _tally_key(question_id):
+    return f'polls:tally:{question_id}'
+
+
+def get_results_versions(question_ids):
+    """Returns the current results version of many questions.
+
+    A missing version starts from the current time in microseconds, so a
+    version lost from the cache never comes back with an old value.
+    Versions expire after POLLS_RESULTS_VERSION_TIMEOUT seconds, any id
+    can be requested and most do not name a question.
+
+    Returns:
+        Dict from question id to version.
+    """
+    keys = {_version_key(question_id): question_id for question_id in question_ids}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        start = time.time_ns() // 1000
+        for key in missing:
+            cache.add(key, start, settings.POLLS_RESULTS_VERSION_TIMEOUT)
+        versions.update(cache.get_many(missing))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def get_results_version(question_id):
+    """Returns the current results version of a question."""
+    return get_results_versions([question_id])[question_id]
+
+
+def get_results_modified(question_ids):
+    """Returns the time of the last results change of many questions.
+
+    A question with no recorded change counts as changed now, and that
+    time is stored, so later requests get the same Last-Modified. Like
+    versions, the times expire after POLLS_RESULTS_VERSION_TIMEOUT.
+
+    Returns:
+        Dict from question id to a POSIX timestamp.
+    """
+    keys = {_modified_key(question_id): question_id for question_id in question_ids}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, settings.POLLS_RESULTS_VERSION_TIMEOUT)
+        found.update(cache.get_many(missing))
+    return {keys[key]: modified for key, modified in found.items()}
+
+
+def bump_results_version(question_id):
+    """Invalidates the cached results of a question."""
+    try:
+        version = cache.incr(_version_key(question_id))
+    except ValueError:
+        get_results_version(question_id)
+        version = cache.incr(_version_key(question_id))
+    cache.set(_modified_key(question_id), time.time(), settings.POLLS_RESULTS_VERSION_TIMEOUT)
+    results_changed.send(sender=Question, question_id=question_id)
+    return version
+
+
+def compute_results(question_ids, fresh_tallies=False):
+    """Returns the results of many questions, read with a single query.
+
+    A question with a ResultSnapshot is served from the snapshot, the
+    live tallies of its choices are ignored. A ranked or approval
+    question gets its last ballot tally, see get_ballot_tally, with the
+    winner and, for ranked questions, the instant-runoff rounds.
+
+    Args:
+        question_ids: Ids of the questions.
+        fresh_tallies: Tally the ballots from the Ballot table instead
+            of taking the cached tally, which may be stale.
+
+    Returns:
+        Dict from question id to a results dict with the question text,
+        kind, end date, choices (id, text and votes) and the total of
+        votes.
+    """
+    rows = (Question.objects.filter(pk__in=question_ids)
+            .order_by('pk', 'choice__pk')
+            .values_list('pk', 'question_text', 'kind', 'end_date', 'choice__pk',
+                         'choice__choice_text', 'choice__vote_count',
+                         'snapshot__total', 'snapshot__choices',
+                         'snapshot__rounds', 'snapshot__winner'))
+    results, ballots = {}, []
+    for (pk, text, kind, end_date, choice_id, choice_text, votes,
+         total, frozen, rounds, winner) in rows:
+        if pk not in results and frozen is not None:
+            results[pk] = {
+                'id': pk,
+                'question_text': text,
+                'kind': kind,
+                'end_date': end_date,
+                'choices': frozen,
+                'total': total,
+                'rounds': rounds,
+                'winner': winner,
+            }
+        elif pk not in results and kind != Question.SINGLE:
+            ballots.append(pk)
+        question = results.setdefault(pk, {
+            'id': pk,
+            'question_text': text,
+            'kind': kind,
+            'end_date': end_date,
+            'choices': [],
+            'total': 0,
+        })
+        if choice_id is not None and frozen is None:
+            question['choices'].append(
+                {'id': choice_id, 'choice_text': choice_text, 'votes': votes})
+            question['total'] += votes
+    tally = tally_results if fresh_tallies else get_ballot_tally
+    for pk in ballots:
+        question = results[pk]
+        question.update(tally(question['kind'], pk, question['choices']))
+    return results
+
+
+def store_ballot_tally(kind, question_id, choices):
+    """Tally the ballots of a question and keep the tally in the cache.
+
+    Returns:
+        The tally, see polls.tally.tally_results.
+    """
+    tally = tally_results(kind, question_id, choices)
+    cache.set(_tally_key(question_id), {
+        'kind': kind,
+        'choice_ids': [choice['id'] for choice in choices],
+        'tallied_at': time.time(),
+        'tally': tally,
+    }, None)
+    return tally
+
+
+def get_ballot_tally(kind, question_id, choices):
+    """Returns the last ballot tally of a ranked or approval question.
+
+    Ballots do not tally the question, they schedule a tally on
+    the TallyScheduler, so a request never tallies because of a ballot.
+    A question without a tally, or whose kind or choices changed since,
+    is tallied right away. A tally older than POLLS_TALLY_MAX_AGE
+    seconds is served while a newer one is scheduled.
+    """
+    entry = cache.get(_tally_key(question_id))
+    if (entry is None or entry['kind'] != kind
+            or entry['choice_ids'] != [choice['id'] for choice in choices]):
+        return store_ballot_tally(kind, question_id, choices)
+    if time.time() - entry['tallied_at'] > settings.POLLS_TALLY_MAX_AGE:
+        schedule_tally(question_id)
+    return entry['tally']
+
+
+def refresh_ballot_tally(question_id):
+    """Tally a question again and invalidate its cached results."""
+    kind = Question.objects.filter(pk=question_id).values_list('kind', flat=True).first()
+    if kind is None or kind == Question.SINGLE:
+        return
+    choices = list(Choice.objects.filter(question_id=question_id)
+                   .order_by('pk').values('id', 'choice_text'))
+    store_ballot_tally(kind, question_id, choices)
+    bump_results_version(question_id)
+
+
+class TallyScheduler:
+    """Debounced background tallies of ranked and approval questions.
+
+    schedule marks a question due delay seconds later and a background
+    thread tallies it then, so a burst of ballots costs one tally. A
+    question scheduled again while due keeps its first due time, so
+    steady voting still gets a tally every delay seconds.
+
+    Attributes:
+        delay (float): Seconds between a ballot and its tally.
+    """
+
+    def __init__(self, delay=2.0):
+        self.delay = delay
+        self._due = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def schedule(self, question_id):
+        """Tally question_id within delay seconds."""
+        with self._lock:
+            self._due.setdefault(question_id, time.monotonic() + self.delay)
+        self._wake.set()
+
+    def run_due(self, now=None):
+        """Tally the questions due at now.
+
+        Returns:
+            The ids of the questions tallied.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [question_id for question_id, at in self._due.items() if at <= now]
+            for question_id in due:
+                del self._due[question_id]
+        for question_id in due:
+            refresh_ballot_tally(question_id)
+        return due
+
+    def start(self):
+        """Start the background tally thread once."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name='ballot-tally', daemon=True)
+            self._thread.start()
+
+    def _next_wait(self):
+        with self._lock:
+            if not self._due:
+                return None
+            return max(0.0, min(self._due.values()) - time.monotonic())
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception('Ballot tally failed')
+            finally:
+                close_old_connections()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_tally_scheduler():
+    """Returns the running tally scheduler of this process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = TallyScheduler(delay=settings.POLLS_TALLY_DELAY)
+            _scheduler.start()
+    return _scheduler
+
+
+def schedule_tally(question_id):
+    """Schedule a background tally of a ranked or approval question."""
+    get_tally_scheduler().schedule(question_id)
+
+
+def get_many_results(question_ids):
+    """Returns the results of many questions, from the cache when possible.
+
+    Results of a closed question are cached as long as its version,
+    POLLS_RESULTS_VERSION_TIMEOUT seconds; results of an open one expire
+    after settings.POLLS_RESULTS_CACHE_TIMEOUT seconds.
+    Questions missing from the cache are read with a single query.
+
+    Returns:
+        Dict from question id to results dict, without the questions that
+        do not exist.
+    """
+    versions = get_results_versions(question_ids)
+    keys = {_results_key(question_id, version): question_id
+            for question_id, version in versions.items()}
+    cached = cache.get_many(keys)
+    results = {keys[key]: value for key, value in cached.items()}
+    missing = [question_id for question_id in question_ids if question_id not in results]
+    if missing:
+        computed = compute_results(missing)
+        now = timezone.now()
+        closed, open_ = {}, {}
+        for question_id, value in computed.items():
+            end_date = value['end_date']
+            target = closed if end_date is not None and end_date < now else open_
+            target[_results_key(question_id, versions[question_id])] = value
+        if closed:
+            cache.set_many(closed, settings.POLLS_RESULTS_VERSION_TIMEOUT)
+        if open_:
+            cache.set_many(open_, settings.POLLS_RESULTS_CACHE_TIMEOUT)
+        results.update(computed)
+    return results
+
+
+def get_results(question_id):
+    """Returns the results of a question, see get_many_results.
+
+    Returns:
+        The results dict, or None if the question does not exist.
+    """
+    return get_many_results([question_id]).get(question_id)
+
+
+async def aget_results(question_id):
+    """Async get_results, a cache hit needs no thread hop for the ORM."""
+    version = await cache.aget(_version_key(question_id))
+    if version is not None:
+        results = await cache.aget(_results_key(question_id, version))
+        if results is not None:
+            return results
+    return await sync_to_async(get_results)(question_id)
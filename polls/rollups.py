@@ -0,0 +1,150 @@
+"""Per-minute, per-hour and per-day vote counts of every choice.
+
+Each vote event adds one to the bucket of its choice, and a changed vote
+also takes one from the bucket of the old choice, so summing a question's
+buckets up to a time gives its tallies at that time. The rollups are
+written in the same transaction as the vote (see polls.voting and
+polls.buffer), and rebuild_rollups recomputes them from the Vote and
+ArchivedVote tables for data written another way, such as imports.
+"""
+import datetime
+from collections import Counter
+from django.db import connection, transaction
+from django.db.models import F, Q
+from polls.models import ArchivedVote, Vote, VoteRollup
+
+GRANULARITIES = (VoteRollup.MINUTE, VoteRollup.HOUR, VoteRollup.DAY)
+
+
+def bucket_start(when, granularity):
+    """Returns the start, in UTC, of the bucket holding when."""
+    when = when.astimezone(datetime.timezone.utc)
+    if granularity == VoteRollup.MINUTE:
+        return when.replace(second=0, microsecond=0)
+    if granularity == VoteRollup.HOUR:
+        return when.replace(minute=0, second=0, microsecond=0)
+    if granularity == VoteRollup.DAY:
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Unknown granularity {granularity!r}')
+
+
+def record_vote_events(events):
+    """Add vote events to the rollups of every granularity.
+
+    Args:
+        events: Iterable of (question_id, choice_id, when, delta), delta
+            is 1 for a vote and -1 for a vote moved away from the choice.
+    """
+    counts = Counter()
+    for question_id, choice_id, when, delta in events:
+        for granularity in GRANULARITIES:
+            counts[question_id, choice_id, granularity, bucket_start(when, granularity)] += delta
+    counts = {key: delta for key, delta in counts.items() if delta}
+    if not counts:
+        return
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(counts)
+    else:
+        _update_or_create(counts)
+
+
+def _upsert(counts):
+    """Add counts with one INSERT ... ON CONFLICT statement."""
+    table = VoteRollup._meta.db_table
+    adapt = connection.ops.adapt_datetimefield_value
+    rows = ', '.join(['(%s, %s, %s, %s, %s)'] * len(counts))
+    params = []
+    for (question_id, choice_id, granularity, bucket), delta in counts.items():
+        params += [question_id, choice_id, granularity, adapt(bucket), delta]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (question_id, choice_id, granularity, bucket, count) '
+            f'VALUES {rows} ON CONFLICT (question_id, granularity, bucket, choice_id) '
+            f'DO UPDATE SET count = {table}.count + excluded.count', params)
+
+
+def _update_or_create(counts):
+    """Add counts with an UPDATE per bucket, creating missing rows."""
+    with transaction.atomic():
+        for (question_id, choice_id, granularity, bucket), delta in counts.items():
+            key = {'question_id': question_id, 'choice_id': choice_id,
+                   'granularity': granularity, 'bucket': bucket}
+            if not VoteRollup.objects.filter(**key).update(count=F('count') + delta):
+                VoteRollup.objects.create(count=delta, **key)
+
+
+def rebuild_rollups(question_ids=None, batch_size=10000):
+    """Recompute the rollups of questions from the Vote and ArchivedVote tables.
+
+    A vote counts in the bucket of its cast_at for its current choice;
+    the history of changed votes is not in the tables, so after a
+    rebuild it is only reflected in the final tallies. Questions with
+    votes archived before their cast_at was kept are left as they are.
+
+    Args:
+        question_ids: Questions to rebuild, None for all of them.
+
+    Returns:
+        Number of votes read.
+    """
+    untimed = ArchivedVote.objects.filter(cast_at__isnull=True).values('question_id')
+    tables = [Vote.objects.exclude(question_id__in=untimed),
+              ArchivedVote.objects.exclude(question_id__in=untimed)]
+    rollups = VoteRollup.objects.exclude(question_id__in=untimed)
+    if question_ids is not None:
+        tables = [votes.filter(question_id__in=question_ids) for votes in tables]
+        rollups = rollups.filter(question_id__in=question_ids)
+    read = 0
+    with transaction.atomic():
+        rollups.delete()
+        for votes in tables:
+            read += _roll_up(votes, batch_size)
+    return read
+
+
+def _roll_up(votes, batch_size):
+    """Add every vote of a queryset, returns the number read."""
+    read = 0
+    events = []
+    for question_id, choice_id, cast_at in (
+            votes.order_by('pk').values_list('question_id', 'choice_id', 'cast_at')
+            .iterator(chunk_size=batch_size)):
+        events.append((question_id, choice_id, cast_at, 1))
+        if len(events) >= batch_size:
+            record_vote_events(events)
+            read += len(events)
+            events = []
+    record_vote_events(events)
+    return read + len(events)
+
+
+def timeline(question_id, granularity, since=None, until=None):
+    """Returns the buckets of a question, read from the rollups only.
+
+    Args:
+        question_id: Id of the question.
+        granularity: VoteRollup.MINUTE, HOUR or DAY.
+        since: Only buckets starting at or after this datetime.
+        until: Only buckets starting before this datetime.
+
+    Returns:
+        List of dicts with the bucket start, the net number of new votes
+        and the per-choice changes, oldest first. Buckets without votes
+        are left out.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity {granularity!r}')
+    condition = Q(question_id=question_id, granularity=granularity)
+    if since is not None:
+        condition &= Q(bucket__gte=since)
+    if until is not None:
+        condition &= Q(bucket__lt=until)
+    buckets = []
+    for bucket, choice_id, count in (VoteRollup.objects.filter(condition)
+                                     .order_by('bucket', 'choice_id')
+                                     .values_list('bucket', 'choice_id', 'count')):
+        if not buckets or buckets[-1]['start'] != bucket:
+            buckets.append({'start': bucket, 'votes': 0, 'choices': {}})
+        buckets[-1]['votes'] += count
+        buckets[-1]['choices'][choice_id] = count
+    return buckets
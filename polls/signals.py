@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mysite.backends.auth import forget_user
+from polls.fragments import invalidate_index_fragment
+from polls.models import Choice, Question
+from polls.pubsub import publish_tallies
+from polls.results import bump_results_version, results_changed
+from polls.voted import load_voted
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    """Drop cached results and index when a question is edited or removed."""
+    bump_results_version(instance.pk)
+    invalidate_index_fragment()
+
+
+@receiver([post_save, post_delete], sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    """Drop cached results when a choice is edited or removed."""
+    bump_results_version(instance.question_id)
+
+
+@receiver(results_changed)
+def push_tallies(sender, question_id, **kwargs):
+    """Send the new tallies to the live results streams."""
+    publish_tallies(question_id)
+
+
+@receiver(user_logged_in)
+def load_voted_questions(sender, request, user, **kwargs):
+    """Keep the questions the user voted on in the new session."""
+    if request is not None and hasattr(request, 'session'):
+        load_voted(request.session, user)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Drop the cached user of sessions, see mysite.backends.auth."""
+    forget_user(instance.pk)
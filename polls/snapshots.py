@@ -0,0 +1,71 @@
+"""Freeze the results of closed questions and archive their votes.
+
+Results of a question stop changing once its end_date passes.
+snapshot_closed_questions stores them in ResultSnapshot, which
+polls.results serves from then on, and archive_votes moves the votes of
+long closed questions to ArchivedVote so the Vote table only holds live
+polls. Both are run by the snapshot_results management command.
+"""
+from django.db import transaction
+from django.utils import timezone
+from polls.models import ArchivedVote, Question, ResultSnapshot, Vote
+from polls.results import bump_results_version, compute_results
+
+
+def snapshot_closed_questions(batch_size=500):
+    """Write a snapshot for every closed question that has none.
+
+    Ballots are tallied from the Ballot table, a snapshot is never
+    frozen from a cached tally that missed the last ballots.
+
+    Returns:
+        Number of snapshots written.
+    """
+    pending = (Question.objects.closed().filter(snapshot__isnull=True)
+               .order_by('pk').values_list('pk', flat=True))
+    written = 0
+    while True:
+        question_ids = list(pending[:batch_size])
+        if not question_ids:
+            return written
+        snapshots = [
+            ResultSnapshot(question_id=question_id, closed_at=results['end_date'],
+                           total=results['total'], choices=results['choices'],
+                           rounds=results.get('rounds', []), winner=results.get('winner'))
+            for question_id, results in compute_results(question_ids, fresh_tallies=True).items()
+        ]
+        ResultSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+        for question_id in question_ids:
+            bump_results_version(question_id)
+        written += len(snapshots)
+
+
+def archive_votes(closed_before, batch_size=5000):
+    """Move the votes of questions closed before closed_before to ArchivedVote.
+
+    Only questions with a snapshot are archived, their tallies are kept
+    in the snapshot and in Choice.vote_count.
+
+    Returns:
+        Number of votes moved.
+    """
+    snapshots = ResultSnapshot.objects.filter(
+        votes_archived_at__isnull=True, closed_at__lt=closed_before)
+    moved = 0
+    for question_id in snapshots.values_list('question_id', flat=True).iterator():
+        votes = Vote.objects.filter(question_id=question_id).order_by('pk')
+        while True:
+            with transaction.atomic():
+                rows = list(votes.values_list(
+                    'pk', 'user_id', 'choice_id', 'cast_at', 'changed_at')[:batch_size])
+                ArchivedVote.objects.bulk_create(
+                    [ArchivedVote(user_id=user_id, question_id=question_id, choice_id=choice_id,
+                                  cast_at=cast_at, changed_at=changed_at)
+                     for _, user_id, choice_id, cast_at, changed_at in rows])
+                Vote.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            moved += len(rows)
+            if len(rows) < batch_size:
+                break
+        ResultSnapshot.objects.filter(question_id=question_id).update(
+            votes_archived_at=timezone.now())
+    return moved
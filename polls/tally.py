@@ -0,0 +1,144 @@
+"""Tally engine for ranked-choice and approval ballots.
+
+Ballots are loaded into one int32 matrix with a row per ballot and a
+column per rank, holding choice indexes and -1 for unused ranks. Every
+round of instant-runoff is a handful of numpy operations over the whole
+matrix, so the cost grows with the number of ballots only through
+vectorized code.
+"""
+import itertools
+import numpy as np
+from polls.models import Ballot, Question
+
+
+def ballot_matrix(rows, choice_ids):
+    """Returns the rank matrix of ballots.
+
+    Args:
+        rows: Lists of choice ids, most preferred first.
+        choice_ids: Ids of the choices of the question; ids not in it,
+            such as deleted choices, are dropped.
+
+    Returns:
+        int32 array of shape (ballots, longest ballot) of indexes into
+        choice_ids, padded with -1.
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64,
+                       count=int(lengths.sum()))
+    indexes = np.full(len(flat), -1, dtype=np.int32)
+    if len(choice_ids):
+        ids = np.asarray(choice_ids, dtype=np.int64)
+        order = np.argsort(ids)
+        position = np.minimum(np.searchsorted(ids[order], flat), len(ids) - 1)
+        known = ids[order][position] == flat
+        indexes[known] = order[position[known]]
+    # At least one column, so that a matrix without ballots still has ranks.
+    width = max(1, int(lengths.max()) if len(rows) else 0)
+    ranks = np.full((len(rows), width), -1, dtype=np.int32)
+    ranks[np.arange(width) < lengths[:, None]] = indexes
+    return ranks
+
+
+def load_ballots(question_id, choice_ids):
+    """Returns the rank matrix of the ballots of a question."""
+    rows = (Ballot.objects.filter(question_id=question_id)
+            .values_list('choice_ids', flat=True).iterator(chunk_size=10000))
+    return ballot_matrix(list(rows), choice_ids)
+
+
+def approval(ranks, choices):
+    """Returns the number of ballots approving each of choices choices."""
+    return np.bincount(ranks[ranks >= 0], minlength=choices)[:choices]
+
+
+def instant_runoff(ranks, choices):
+    """Run instant-runoff rounds until a choice holds a majority.
+
+    Each round counts every ballot for its highest ranked choice still
+    running. Without a majority the choice with the fewest votes is
+    eliminated; a tie goes against the choice with fewer first round
+    votes, then against the one listed later.
+
+    Args:
+        ranks: Rank matrix from ballot_matrix.
+        choices: Number of choices.
+
+    Returns:
+        Tuple of the list of rounds and the index of the winner, None
+        without ballots. A round is a dict with the counts array, the
+        mask of choices still running, the eliminated index (None in the
+        last round) and the number of exhausted ballots.
+    """
+    running = np.ones(choices, dtype=bool)
+    rows = np.arange(len(ranks))
+    rounds, first_counts = [], None
+    while True:
+        # Ballot positions that name a choice still running.
+        valid = (ranks >= 0) & running[np.maximum(ranks, 0)]
+        live = valid.any(axis=1)
+        top = ranks[rows, valid.argmax(axis=1)]
+        counts = np.bincount(top[live], minlength=choices)[:choices]
+        if first_counts is None:
+            first_counts = counts
+        cast = int(live.sum())
+        round_ = {'counts': counts, 'running': running.copy(), 'eliminated': None,
+                  'exhausted': len(ranks) - cast}
+        rounds.append(round_)
+        if cast == 0:
+            return rounds, None
+        leader = int(np.argmax(np.where(running, counts, -1)))
+        if counts[leader] * 2 > cast or running.sum() <= 2:
+            if running.sum() == 2 and counts[leader] * 2 == cast:
+                # Two choices tied, the first round decides.
+                tied = np.flatnonzero(running & (counts == counts[leader]))
+                leader = int(tied[np.argmax(first_counts[tied])])
+            return rounds, leader
+        candidates = np.flatnonzero(running)
+        # Fewest votes, then fewest first round votes, then listed last.
+        loser = candidates[np.lexsort((-candidates, first_counts[candidates],
+                                       counts[candidates]))[0]]
+        round_['eliminated'] = int(loser)
+        running[loser] = False
+
+
+def tally_results(kind, question_id, choices):
+    """Returns the ballot results of a ranked or approval question.
+
+    Args:
+        kind: Question.RANKED or Question.APPROVAL.
+        question_id: Id of the question.
+        choices: Choice dicts of the question with id and choice_text.
+
+    Returns:
+        Dict with the choices (votes are first preferences for ranked
+        questions, approvals otherwise), the total number of ballots,
+        the winner id and, for ranked questions, the rounds as lists of
+        per-choice dicts.
+    """
+    choice_ids = [choice['id'] for choice in choices]
+    ranks = load_ballots(question_id, choice_ids)
+    if not choices:
+        return {'choices': [], 'total': len(ranks), 'winner': None, 'rounds': []}
+    if kind == Question.APPROVAL:
+        counts = approval(ranks, len(choices))
+        rounds = []
+        winner = int(np.argmax(counts)) if len(ranks) and counts.any() else None
+    else:
+        raw_rounds, winner = instant_runoff(ranks, len(choices))
+        counts = raw_rounds[0]['counts']
+        rounds = [{
+            'number': number,
+            'exhausted': raw['exhausted'],
+            'choices': [{'id': choice['id'], 'choice_text': choice['choice_text'],
+                         'votes': int(votes), 'eliminated': raw['eliminated'] == index}
+                        for index, (choice, votes) in enumerate(zip(choices, raw['counts']))
+                        if raw['running'][index]],
+        } for number, raw in enumerate(raw_rounds, start=1)]
+    return {
+        'choices': [dict(choice, votes=int(votes)) for choice, votes in zip(choices, counts)],
+        'total': len(ranks),
+        'winner': None if winner is None else choice_ids[winner],
+        'rounds': rounds,
+    }
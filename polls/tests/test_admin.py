@@ -0,0 +1,79 @@
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from polls.admin import QuestionAdmin
+from polls.benchmark import seed
+from polls.models import Question, Vote
+from polls.pagination import EstimatedCountPaginator
+
+
+class VoteAdminTests(TestCase):
+    def setUp(self):
+        seed(questions=5, choices=2, votes=40, users=10)
+        self.admin = User.objects.create_superuser('admin', password='admin-pass')
+        self.client.force_login(self.admin)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:polls_vote_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Rows are joined, so more votes cost no extra queries."""
+        before = self.changelist_queries()
+        Vote.objects.filter(pk__in=list(Vote.objects.values_list('pk', flat=True)[:38])).delete()
+        self.assertEqual(self.changelist_queries(), before)
+
+    def test_change_form_uses_raw_id_widgets(self):
+        """The change form does not list every user and choice."""
+        vote = Vote.objects.first()
+        response = self.client.get(reverse('admin:polls_vote_change', args=(vote.pk,)))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField', count=3)
+
+
+class QuestionAdminSearchTests(TestCase):
+    def setUp(self):
+        seed(questions=3, choices=2, votes=0, users=1)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin-pass'))
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:polls_question_changelist'), {'q': term})
+        return [question.question_text for question in response.context['cl'].result_list]
+
+    def test_search_matches_prefix(self):
+        self.assertEqual(self.search('Benchmark question 1'), ['Benchmark question 1'])
+        self.assertEqual(self.search('question 1'), [])
+
+    def test_search_ignores_case(self):
+        self.assertEqual(self.search('bench'), ['Benchmark question 2', 'Benchmark question 1',
+                                                'Benchmark question 0'])
+        self.assertEqual(self.search('BENCHMARK QUESTION 2'), ['Benchmark question 2'])
+
+    def test_search_uses_the_index(self):
+        admin = QuestionAdmin(Question, site)
+        queryset, _ = admin.get_search_results(None, Question.objects.all(), 'Bench')
+        self.assertIn('question_text_lower_idx', queryset.explain())
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        seed(questions=2, choices=2, votes=10, users=10)
+
+    def test_large_unfiltered_table_is_estimated(self):
+        """Above the threshold the count comes from the estimate."""
+        paginator = EstimatedCountPaginator(Vote.objects.order_by('pk'), 5)
+        paginator.threshold = 1
+        last = Vote.objects.order_by('pk').last().pk
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, last)
+
+    def test_filtered_queryset_is_counted(self):
+        """A filtered queryset gets its exact count."""
+        paginator = EstimatedCountPaginator(Vote.objects.filter(choice__vote_count__gte=0).order_by('pk'), 5)
+        paginator.threshold = 1
+        self.assertEqual(paginator.count, 10)
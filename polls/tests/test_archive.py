@@ -0,0 +1,71 @@
+import datetime
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.models import Question
+from polls.pagination import decode_cursor, keyset_page
+from .question_template import create_question
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        pub_date = timezone.now() - datetime.timedelta(days=1)
+        self.questions = [
+            Question.objects.create(question_text=f'Q{i}', pub_date=pub_date)
+            for i in range(5)]
+
+    def test_pages_cover_every_question_once(self):
+        """Following cursors visits each question once, newest first."""
+        seen, cursor = [], None
+        while True:
+            page, cursor = keyset_page(Question.objects.all(), cursor, 2)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(seen, sorted(self.questions, key=lambda q: -q.pk))
+
+    def test_invalid_cursor(self):
+        """A cursor that was not issued raises ValueError."""
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+
+
+class ArchiveViewTests(TestCase):
+    def test_archive_lists_published_questions(self):
+        """The archive lists published questions only by default."""
+        past = create_question(question_text='Past question.', days=-30)
+        create_question(question_text='Future question.', days=30)
+        response = self.client.get(reverse('polls:archive'))
+        self.assertEqual(list(response.context['question_list']), [past])
+
+    def test_archive_upcoming_filter(self):
+        """status=upcoming lists the questions that are not published yet."""
+        create_question(question_text='Past question.', days=-30)
+        future = create_question(question_text='Future question.', days=30)
+        response = self.client.get(reverse('polls:archive'), {'status': 'upcoming'})
+        self.assertEqual(list(response.context['question_list']), [future])
+
+    def test_archive_bad_cursor(self):
+        """An invalid cursor returns 404."""
+        response = self.client.get(reverse('polls:archive'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_json_closed_filter(self):
+        """The JSON listing filters closed questions and pages by cursor."""
+        for days in (-10, -20, -30):
+            question = create_question(question_text=f'{days}', days=days)
+            question.end_date = question.pub_date + datetime.timedelta(days=1)
+            question.save()
+        create_question(question_text='Open question.', days=-1)
+        url = reverse('polls:question_list_json')
+        data = self.client.get(url, {'status': 'closed', 'limit': 2}).json()
+        self.assertEqual([q['question_text'] for q in data['results']], ['-10', '-20'])
+        data = self.client.get(url, {'status': 'closed', 'cursor': data['next']}).json()
+        self.assertEqual([q['question_text'] for q in data['results']], ['-30'])
+        self.assertIsNone(data['next'])
+
+    def test_json_unknown_status(self):
+        """An unknown status returns 400."""
+        response = self.client.get(reverse('polls:question_list_json'), {'status': 'x'})
+        self.assertEqual(response.status_code, 400)
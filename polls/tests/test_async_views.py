@@ -0,0 +1,56 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+
+from polls import async_views
+from polls.models import Vote
+from .question_template import create_question
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.question = create_question(question_text='Async?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+
+    async def test_async_index(self):
+        """The async index lists published questions for anonymous users."""
+        response = await async_views.index(self.factory.get('/polls/'))
+        self.assertContains(response, 'Async?')
+
+    async def test_async_results(self):
+        """The async results page shows the tallies."""
+        request = self.factory.get('/results/')
+        response = await async_views.results(request, self.question.id)
+        self.assertContains(response, 'Yes -- 0')
+
+    async def test_async_results_unknown_question(self):
+        """Results of a missing question raise 404."""
+        with self.assertRaises(Http404):
+            await async_views.results(self.factory.get('/'), 999)
+
+    async def test_async_vote_requires_login(self):
+        """Anonymous voters are redirected to the login page."""
+        request = self.factory.post('/vote/', {'choice': self.choice.id})
+        response = await async_views.vote(request, self.question.id)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(settings.LOGIN_URL, response.url)
+
+    def test_async_vote(self):
+        """A logged in user's vote is recorded by the async view."""
+        user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(user)
+        session = self.client.session
+        request = self.factory.post(
+            '/vote/', f'choice={self.choice.id}',
+            content_type='application/x-www-form-urlencoded')
+        request.session = session
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+        response = async_to_sync(async_views.vote)(request, self.question.id)
+        self.assertEqual(response.url, reverse('polls:results', args=(self.question.id,)))
+        self.assertEqual(Vote.objects.get(user=user).choice, self.choice)
@@ -0,0 +1,81 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls.voted import remember_vote
+from .question_template import create_question
+
+
+# The fast path, on by default with a shared cache.
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+                   AUTH_USER_CACHE_TIMEOUT=300)
+class SessionAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.question = create_question(question_text='Fast?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:detail', args=(self.question.id,))
+
+    def test_user_is_read_once(self):
+        """Later requests take the user of the session from the cache."""
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        # The question, its choices and the vote of the user.
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+
+    def test_saving_the_user_drops_the_cached_copy(self):
+        """A deactivated user is logged out on the next request."""
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_sessions_of_the_model_backend_stay_logged_in(self):
+        """Sessions from before the cached backend survive a deploy."""
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=0)
+    def test_cache_can_be_turned_off(self):
+        self.client.force_login(self.user)
+        self.client.get(self.url)
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        """Votes are remembered without a session table."""
+        self.client.force_login(self.user)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        response = self.client.get(self.url)
+        self.assertContains(response, 'You voted Yes')
+
+    def test_same_vote_does_not_modify_the_session(self):
+        """Voting the same choice again leaves the session unsaved."""
+        self.client.force_login(self.user)
+        request = self.client.get(self.url).wsgi_request
+        remember_vote(request, self.question.id, self.choice)
+        request.session.modified = False
+        remember_vote(request, self.question.id, self.choice)
+        self.assertFalse(request.session.modified)
+
+
+class SignupTests(TestCase):
+    def test_signup_logs_in_without_checking_the_password(self):
+        """The new user is logged in without hashing the password again."""
+        with mock.patch('django.contrib.auth.base_user.check_password') as check_password:
+            response = self.client.post(reverse('signup'), {
+                'username': 'newcomer', 'password1': 'a-long-pass-phrase',
+                'password2': 'a-long-pass-phrase'})
+        self.assertRedirects(response, reverse('polls:index'), fetch_redirect_response=False)
+        check_password.assert_not_called()
+        self.assertEqual(int(self.client.session['_auth_user_id']),
+                         User.objects.get(username='newcomer').pk)
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from polls.buffer import VoteBuffer
+from polls.models import Vote
+from .question_template import create_question
+
+
+class VoteBufferTests(TestCase):
+    def setUp(self):
+        self.buffer = VoteBuffer(batch_size=2, max_pending=2)
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.question = create_question(question_text='Buffered?', days=-1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def submit(self, user, choice):
+        return self.buffer.submit(user.pk, self.question.id, choice.id)
+
+    def test_flush_writes_votes_and_tallies(self):
+        """Flushed ballots become Vote rows and tally points."""
+        self.submit(self.user, self.first)
+        self.buffer.flush()
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.first)
+
+    def test_last_ballot_wins(self):
+        """A newer ballot of the same user replaces the pending one."""
+        self.submit(self.user, self.first)
+        self.submit(self.user, self.second)
+        self.buffer.flush()
+        self.assertEqual(Vote.objects.get(user=self.user).choice, self.second)
+        self.assertEqual(self.buffer.stats()['last_batch_size'], 1)
+
+    def test_flush_moves_existing_vote(self):
+        """A buffered ballot moves an already stored vote."""
+        self.submit(self.user, self.first)
+        self.buffer.flush()
+        self.submit(self.user, self.second)
+        self.buffer.flush()
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.votes, self.second.votes), (0, 1))
+
+    def test_full_buffer_refuses_new_ballot(self):
+        """submit returns False once max_pending ballots are waiting."""
+        other = User.objects.create_user('other', password='vote-pass')
+        third = User.objects.create_user('third', password='vote-pass')
+        self.assertTrue(self.submit(self.user, self.first))
+        self.assertTrue(self.submit(other, self.first))
+        self.assertFalse(self.submit(third, self.first))
+        self.assertTrue(self.submit(self.user, self.second))
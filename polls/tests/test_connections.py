@@ -0,0 +1,55 @@
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from mysite.backends.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteBackendTests(TestCase):
+    def test_pragmas_are_applied(self):
+        """New connections run the configured pragmas."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transactions_begin_immediate(self):
+        """Atomic blocks take the write lock when they begin."""
+        wrapper = DatabaseWrapper(dict(connection.settings_dict), alias='check')
+        wrapper.get_connection_params()
+        with mock.patch.object(wrapper, 'cursor') as cursor:
+            wrapper._start_transaction_under_autocommit()
+        cursor.return_value.execute.assert_called_once_with('BEGIN IMMEDIATE')
+
+
+class SQLiteOptionsTests(SimpleTestCase):
+    def params(self, **options):
+        settings_dict = dict(connection.settings_dict, OPTIONS=options)
+        return DatabaseWrapper(settings_dict, alias='check').get_connection_params()
+
+    def test_options_are_not_passed_to_sqlite(self):
+        """pragmas and transaction_mode are not sqlite3.connect arguments."""
+        params = self.params(pragmas={'cache_size': -2000}, transaction_mode='IMMEDIATE')
+        self.assertNotIn('pragmas', params)
+        self.assertNotIn('transaction_mode', params)
+
+    def test_invalid_options(self):
+        """Values that are not plain words are refused."""
+        with self.assertRaises(ImproperlyConfigured):
+            self.params(pragmas={'journal_mode': 'WAL; DROP TABLE x'})
+        with self.assertRaises(ImproperlyConfigured):
+            self.params(transaction_mode='LAZY')
+
+
+@override_settings(DATABASE_CONN_HEALTH_CHECKS=True)
+class ConnectionHealthTests(TestCase):
+    def test_unusable_connection_is_closed(self):
+        """A broken persistent connection is closed before the request."""
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            self.client.get(reverse('polls:index'))
+        close.assert_called()
@@ -1,5 +1,7 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
+from polls.voting import cast_vote
 from .question_template import create_question
 
 
@@ -18,3 +20,38 @@ class QuestionDetailViewTests(TestCase):
         url = reverse('polls:detail', args=(past_ques.id,))
         response = self.client.get(url)
         self.assertEqual(response.status_code, 302)
+
+
+class DetailViewQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(self.user)
+        self.question = create_question(question_text='Detail?', days=-1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+        self.url = reverse('polls:detail', args=(self.question.id,))
+
+    def test_detail_checks_vote_of_this_question(self):
+        """The checked choice is the user's vote on this question only."""
+        other = create_question(question_text='Other?', days=-1)
+        other_choice = other.choice_set.create(choice_text='Other')
+        cast_vote(self.user, other_choice)
+        cast_vote(self.user, self.second)
+        # The voted map is read from the Vote table at login.
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['check_choice'], self.second.id)
+        self.assertContains(response, 'You voted Second')
+
+    def test_detail_query_count(self):
+        """Session, user, question, choices and the vote: five queries."""
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Second')
+
+    def test_voted_question_query_count(self):
+        """The vote of a question in the map of the session costs no query."""
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.first.id})
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'You voted First')
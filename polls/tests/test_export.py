@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from polls.models import Vote
+from .question_template import create_question
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.question = create_question(question_text='Export?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes', vote_count=1)
+        Vote.objects.create(user=self.user, question=self.question, choice=self.choice)
+        self.other = create_question(question_text='Other?', days=-10)
+        self.other.choice_set.create(choice_text='No')
+
+    def export(self, *args):
+        out = io.StringIO()
+        call_command('export_votes', *args, stdout=out)
+        return out.getvalue()
+
+    def test_command_exports_votes_as_csv(self):
+        """The default export is one CSV row per vote after a header."""
+        rows = list(csv.reader(io.StringIO(self.export())))
+        self.assertEqual(rows[0][:3], ['id', 'user_id', 'username'])
+        self.assertEqual(rows[1][2], 'voter')
+        self.assertEqual(len(rows), 2)
+
+    def test_command_exports_filtered_tallies_as_ndjson(self):
+        """--tallies with --since exports the choices of recent questions."""
+        since = (self.question.pub_date.date()).isoformat()
+        lines = self.export('--tallies', '--format', 'ndjson', '--since', since)
+        rows = [json.loads(line) for line in lines.splitlines()]
+        self.assertEqual(rows, [{
+            'question_id': self.question.id, 'question_text': 'Export?',
+            'choice_id': self.choice.id, 'choice_text': 'Yes', 'votes': 1}])
+
+    def test_admin_action_streams_selected_questions(self):
+        """The admin action answers with a streaming attachment."""
+        admin = User.objects.create_superuser('admin', password='admin-pass')
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:polls_question_changelist'), {
+            'action': 'export_votes_ndjson',
+            '_selected_action': [self.other.id],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(b''.join(response.streaming_content), b'')
@@ -0,0 +1,125 @@
+import io
+import os
+import tempfile
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from polls.fragments import INDEX_FRAGMENT_KEY
+from polls.importer import iter_json_array
+from polls.models import Choice, Question, Vote, VoteRollup
+from polls.results import get_results_version
+
+
+class ImportPollsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        call_command('import_polls', path, *args, stdout=io.StringIO())
+
+    def test_json_array_is_read_in_chunks(self):
+        """Items split across read chunks are still parsed whole."""
+        stream = io.StringIO('[{"a": 1}, {"b": [1, 2, 3]},\n {"c": "x"}]')
+        self.assertEqual(list(iter_json_array(stream, chunk_size=4)),
+                         [{'a': 1}, {'b': [1, 2, 3]}, {'c': 'x'}])
+
+    def test_import_fixtures(self):
+        """The shipped fixtures import with derived vote questions and tallies."""
+        data = os.path.join(settings.BASE_DIR, 'data')
+        self.run_import(os.path.join(data, 'users.json'), '--batch-size', '3')
+        self.run_import(os.path.join(data, 'polls.json'), '--batch-size', '3')
+        self.assertTrue(User.objects.exists())
+        self.assertTrue(Question.objects.exists())
+        self.assertEqual(Vote.objects.count(), 6)  # every vote of polls.json
+        for vote in Vote.objects.select_related('choice'):
+            self.assertEqual(vote.question_id, vote.choice.question_id)
+        for choice in Choice.objects.all():
+            self.assertEqual(choice.vote_count, choice.vote_set.count())
+
+    def test_ndjson_and_csv(self):
+        """NDJSON and CSV rows are imported, votes without question included."""
+        self.write('users.ndjson', '{"model": "auth.user", "pk": 1, '
+                   '"fields": {"username": "a", "password": "!"}}\n')
+        self.run_import(os.path.join(self.tmpdir.name, 'users.ndjson'))
+        questions = self.write('q.csv', 'pk,question_text,pub_date,end_date\n'
+                               '1,Tea?,2022-09-05T15:36:59Z,\n')
+        choices = self.write('c.csv', 'pk,question,choice_text\n1,1,Yes\n2,1,No\n')
+        votes = self.write('v.csv', 'pk,user,choice\n1,1,2\n')
+        self.run_import(questions, '--model', 'polls.question')
+        self.run_import(choices, '--model', 'polls.choice')
+        self.run_import(votes, '--model', 'polls.vote')
+        self.assertIsNone(Question.objects.get().end_date)
+        self.assertEqual(Vote.objects.get().question_id, 1)
+        self.assertEqual(Choice.objects.get(pk=2).vote_count, 1)
+
+    def test_resume_skips_checkpointed_records(self):
+        """--resume continues after the records saved in the checkpoint."""
+        path = self.write('q.ndjson', ''.join(
+            f'{{"model": "polls.question", "pk": {i}, "fields": '
+            f'{{"question_text": "Q{i}", "pub_date": "2022-09-05T15:36:59Z"}}}}\n'
+            for i in range(1, 6)))
+        self.write('q.ndjson.checkpoint', '3')
+        self.run_import(path, '--resume')
+        self.assertEqual(list(Question.objects.values_list('pk', flat=True)), [4, 5])
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_vote_choice_in_the_same_batch(self):
+        """A vote finds its question through a choice of its own batch."""
+        path = self.write('all.ndjson', '\n'.join([
+            '{"model": "auth.user", "pk": 1, "fields": {"username": "a", "password": "!"}}',
+            '{"model": "polls.question", "pk": 1, "fields": {"question_text": "Tea?", '
+            '"pub_date": "2022-09-05T15:36:59Z"}}',
+            '{"model": "polls.choice", "pk": 1, "fields": {"question": 1, "choice_text": "Yes"}}',
+            '{"model": "polls.vote", "pk": 1, "fields": {"user": 1, "choice": 1}}',
+        ]))
+        out = io.StringIO()
+        call_command('import_polls', path, stdout=out)
+        self.assertIn('Imported 4 records, skipped 0', out.getvalue())
+        self.assertEqual(Vote.objects.get().question_id, 1)
+        self.assertEqual(Choice.objects.get().vote_count, 1)
+        out = io.StringIO()
+        call_command('import_polls', path, stdout=out)
+        self.assertIn('Imported 0 records, skipped 4', out.getvalue())
+
+    def test_vote_for_unknown_choice_fails(self):
+        path = self.write('v.ndjson', '{"model": "polls.vote", "pk": 1, '
+                          '"fields": {"user": 1, "choice": 99}}\n')
+        with self.assertRaisesMessage(CommandError, 'unknown choice 99'):
+            self.run_import(path)
+
+    def test_import_invalidates_caches_and_rolls_up(self):
+        """Rows written without signals still reach the caches and rollups."""
+        user = User.objects.create_user('a')
+        question = Question.objects.create(question_text='Tea?', pub_date='2022-09-05T15:36:59Z')
+        choice = question.choice_set.create(choice_text='Yes')
+        version = get_results_version(question.pk)
+        cache.set(INDEX_FRAGMENT_KEY, 'stale')
+        path = self.write('v.ndjson', f'{{"model": "polls.vote", "pk": 1, "fields": '
+                          f'{{"user": {user.pk}, "choice": {choice.pk}, '
+                          f'"cast_at": "2022-09-06T10:00:00Z"}}}}\n')
+        self.run_import(path, '--no-reconcile')
+        self.assertGreater(get_results_version(question.pk), version)
+        self.assertIsNone(cache.get(INDEX_FRAGMENT_KEY))
+        self.assertEqual(VoteRollup.objects.filter(question=question, granularity='day').get().count, 1)
+
+    def test_sequences_of_imported_models_are_reset(self):
+        """Explicit pks are followed by a sequence reset, as with loaddata."""
+        path = self.write('q.ndjson', '{"model": "polls.question", "pk": 7, "fields": '
+                          '{"question_text": "Q", "pub_date": "2022-09-05T15:36:59Z"}}\n')
+        with mock.patch.object(connection.ops, 'sequence_reset_sql', return_value=[]) as reset:
+            self.run_import(path)
+        self.assertEqual(reset.call_args.args[1], [Question])
+        self.assertEqual(Question.objects.create(question_text='Next', pub_date='2022-09-06T00:00:00Z').pk, 8)
@@ -1,10 +1,17 @@
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
+from polls.fragments import next_index_boundary
+from polls.models import Question
 from .question_template import create_question
 
 
 class QuestionIndexViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
     def test_no_question(self):
         """If no question exist, an appropriate message is displayed."""
         response = self.client.get(reverse('polls:index'))
@@ -41,3 +48,30 @@ class QuestionIndexViewTests(TestCase):
             question_text="Future question 2.", days=-5)
         resp = self.client.get(reverse('polls:index'))
         self.assertQuerysetEqual(resp.context['latest_question_list'], [question2, question1],)
+
+
+class IndexFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_index_needs_no_query(self):
+        """A second anonymous request renders the index without a query."""
+        create_question(question_text="Past question.", days=-30)
+        self.client.get(reverse('polls:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "Past question.")
+
+    def test_saving_question_invalidates_index(self):
+        """A new question shows up at once."""
+        self.client.get(reverse('polls:index'))
+        create_question(question_text="New question.", days=-1)
+        response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, "New question.")
+
+    def test_fragment_expires_at_next_boundary(self):
+        """The fragment is cached until the next question is published."""
+        create_question(question_text="Soon question.", days=0.5)
+        questions = Question.objects.published().with_is_open()[:5]
+        boundary = next_index_boundary(list(questions), timezone.now())
+        self.assertEqual(boundary, Question.objects.get().pub_date)
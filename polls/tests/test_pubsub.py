@@ -0,0 +1,95 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from polls import pubsub
+from polls.pubsub import InMemoryBroker, Subscription
+from .question_template import create_question
+
+
+class BrokerTests(TestCase):
+    def test_publish_reaches_every_subscriber(self):
+        """One published delta is handed to all subscribers of a question."""
+        broker = InMemoryBroker()
+        first, second = broker.subscribe(1), broker.subscribe(1)
+        other = broker.subscribe(2)
+        broker.publish(1, {'total': 1, 'choices': {5: 1}})
+        self.assertEqual(first.get(0), {'total': 1, 'choices': {5: 1}})
+        self.assertEqual(second.get(0), {'total': 1, 'choices': {5: 1}})
+        self.assertIsNone(other.get(0))
+
+    def test_pending_deltas_are_coalesced(self):
+        """An idle subscription keeps only the merged latest tallies."""
+        subscription = Subscription(1)
+        subscription.put({'total': 1, 'choices': {5: 1}})
+        subscription.put({'total': 2, 'choices': {6: 1}})
+        self.assertEqual(subscription.get(0), {'total': 2, 'choices': {5: 1, 6: 1}})
+        self.assertIsNone(subscription.get(0))
+
+    def test_connection_cap(self):
+        """subscribe returns None once max_connections are open."""
+        broker = InMemoryBroker(max_connections=1)
+        subscription = broker.subscribe(1)
+        self.assertIsNone(broker.subscribe(2))
+        broker.unsubscribe(subscription)
+        self.assertIsNotNone(broker.subscribe(2))
+
+
+@override_settings(POLLS_LIVE_RESULTS=True)
+class ResultsStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        pubsub._broker = None
+        self.question = create_question(question_text='Live?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:results_stream', args=(self.question.id,))
+
+    def tearDown(self):
+        pubsub._broker = None
+
+    def test_stream_starts_with_results(self):
+        """The first event holds every tally."""
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first = next(iter(response.streaming_content)).decode()
+        self.assertTrue(first.startswith('event: results'))
+        response.close()
+
+    def test_vote_pushes_delta(self):
+        """A vote sends the changed tally to the open stream."""
+        subscription = pubsub.get_broker().subscribe(self.question.id)
+        user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(user)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        self.assertEqual(subscription.get(0), {'total': 1, 'choices': {self.choice.id: 1}})
+
+    @override_settings(POLLS_SSE_MAX_CONNECTIONS=0)
+    def test_stream_cap_returns_503(self):
+        """Streams beyond the cap are refused with Retry-After."""
+        pubsub._broker = None
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_unread_stream_holds_no_slot(self):
+        """The subscription is only taken once the response is iterated."""
+        response = self.client.get(self.url)
+        self.assertFalse(pubsub.get_broker().has_subscribers(self.question.id))
+        response.close()
+
+    def test_results_page_opens_the_stream(self):
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'EventSource')
+
+    @override_settings(POLLS_LIVE_RESULTS=False)
+    def test_stream_is_opt_in(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertNotContains(response, 'EventSource')
+
+    @override_settings(POLLS_ASYNC_VIEWS=True)
+    def test_stream_is_off_under_asgi(self):
+        """A blocking stream would stall the event loop of an ASGI worker."""
+        self.assertEqual(self.client.get(self.url).status_code, 404)
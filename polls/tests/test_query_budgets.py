@@ -0,0 +1,42 @@
+import random
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+
+from polls import benchmark
+from polls.models import Choice, Vote
+
+
+class QueryBudgetTests(TestCase):
+    """Each view stays within benchmark.QUERY_BUDGETS on a cold cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = benchmark.seed(questions=10, choices=4, votes=50, users=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.get(pk=self.dataset['users'][0]))
+
+    def assertWithinBudget(self, endpoint):
+        rng = random.Random(0)
+        for _ in range(3):
+            queries = benchmark.measure_queries(self.client, endpoint, self.dataset, rng)
+            self.assertLessEqual(queries, benchmark.QUERY_BUDGETS[endpoint])
+
+    def test_index_budget(self):
+        self.assertWithinBudget('index')
+
+    def test_detail_budget(self):
+        self.assertWithinBudget('detail')
+
+    def test_results_budget(self):
+        self.assertWithinBudget('results')
+
+    def test_vote_budget(self):
+        self.assertWithinBudget('vote')
+
+    def test_seed_tallies_match_votes(self):
+        """Seeded tallies agree with the seeded Vote rows."""
+        total = sum(Choice.objects.values_list('vote_count', flat=True))
+        self.assertEqual(total, Vote.objects.count())
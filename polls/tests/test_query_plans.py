@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.test import TestCase
+
+from polls.models import Question, Vote
+from .question_template import create_question
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the hot queries and check that they use the indexes."""
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """Fail unless the plan of queryset names one of index_names."""
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_index_listing_uses_pub_date_index(self):
+        """The index page query is served from a pub_date index."""
+        queryset = Question.objects.published().with_is_open()
+        self.assertUsesIndex(queryset.order_by('-pub_date')[:5],
+                             'question_pub_end_idx', 'question_pub_id_idx')
+
+    def test_archive_page_uses_keyset_index(self):
+        """A deep archive page seeks on question_pub_id_idx."""
+        question = create_question(question_text='Archived.', days=-1)
+        queryset = Question.objects.published()
+        page = queryset.order_by('-pub_date', '-pk').filter(
+            Q(pub_date__lt=question.pub_date)
+            | Q(pub_date=question.pub_date, pk__lt=question.pk))
+        self.assertUsesIndex(page[:20], 'question_pub_id_idx')
+
+    def test_user_vote_lookup_uses_unique_index(self):
+        """The vote of a user on a question is found through the constraint."""
+        user = User.objects.create_user('voter', password='vote-pass')
+        queryset = Vote.objects.filter(user=user, question_id=1)
+        # SQLite backs the constraint with an automatic index.
+        self.assertUsesIndex(queryset, 'unique_vote_per_question',
+                             'sqlite_autoindex_polls_vote')
+
+    def test_question_votes_use_question_index(self):
+        """Votes of a question are read through vote_question_choice_idx."""
+        queryset = Vote.objects.filter(question_id=1).values('choice')
+        self.assertUsesIndex(queryset, 'vote_question_choice_idx')
+
+
+class QuestionQuerySetTests(TestCase):
+    def test_is_open_matches_can_vote(self):
+        """The SQL is_open annotation agrees with Question.can_vote."""
+        create_question(question_text='Open.', days=-1)
+        closed = create_question(question_text='Closed.', days=-5)
+        closed.end_date = closed.pub_date
+        closed.save()
+        create_question(question_text='Future.', days=5)
+        for question in Question.objects.with_is_open():
+            self.assertIs(question.is_open, question.can_vote())
@@ -0,0 +1,59 @@
+import itertools
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from mysite.middleware import percentile, query_stats
+from .question_template import create_question
+
+
+@override_settings(QUERY_STATS_ENABLED=True)
+class QueryStatsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        query_stats.clear()
+        create_question(question_text='Timed?', days=-1)
+
+    def test_server_timing_header(self):
+        """Responses carry the SQL and render timings."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_render_time_of_render_views(self):
+        """Views rendering with render() report their render time too."""
+        user = User.objects.create_user('voter', password='pass')
+        self.client.force_login(user)
+        question = create_question(question_text='Detail?', days=-1)
+        with mock.patch('mysite.backends.templates.time.perf_counter', side_effect=itertools.count()):
+            self.client.get(reverse('polls:detail', args=(question.id,)))
+        self.assertEqual(query_stats.summary()['polls:detail']['render_ms']['p50'], 1000)
+
+    def test_stats_endpoint_is_staff_only(self):
+        """Anonymous users are sent to the admin login."""
+        response = self.client.get(reverse('query_stats'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_stats_endpoint_reports_views(self):
+        """Staff read per-view percentiles."""
+        self.client.get(reverse('polls:index'))
+        staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(reverse('query_stats')).json()
+        self.assertEqual(data['polls:index']['requests'], 1)
+        self.assertIn('p95', data['polls:index']['sql_ms'])
+
+    def test_percentile(self):
+        """Nearest-rank percentile."""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+
+
+class QueryStatsDisabledTests(TestCase):
+    def test_no_header_when_disabled(self):
+        """The middleware is left out of the chain by default."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,62 @@
+import datetime
+import time
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.results import get_results, get_results_version
+from .question_template import create_question
+
+
+class ResultsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Results?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_results_show_votes(self):
+        """The results page lists each choice with its tally."""
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Yes -- 0')
+
+    def test_unknown_question(self):
+        """Results of a missing question return 404."""
+        response = self.client.get(reverse('polls:results', args=(999,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_results_are_cached(self):
+        """A second request is served without any query."""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_vote_invalidates_results(self):
+        """A vote bumps the version so the new tally is shown at once."""
+        self.client.get(self.url)
+        version = get_results_version(self.question.id)
+        user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(user)
+        vote_url = reverse('polls:vote', args=(self.question.id,))
+        self.client.post(vote_url, {'choice': self.choice.id})
+        self.assertGreater(get_results_version(self.question.id), version)
+        self.assertContains(self.client.get(self.url), 'Yes -- 1')
+
+    @override_settings(POLLS_RESULTS_CACHE_TIMEOUT=0)
+    def test_closed_results_ignore_open_poll_timeout(self):
+        """Results of a closed question ignore the open-poll timeout."""
+        self.question.end_date = timezone.now() - datetime.timedelta(hours=1)
+        self.question.save()
+        get_results(self.question.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_results(self.question.id)['total'], 0)
+
+    @override_settings(POLLS_RESULTS_VERSION_TIMEOUT=60)
+    def test_keys_of_unknown_questions_expire(self):
+        """Requests for ids that name no question leave no permanent keys."""
+        self.client.get(reverse('polls:results_json', args=(987654,)))
+        for name in ('version', 'modified'):
+            key = cache.make_key(f'polls:results:987654:{name}')
+            self.assertLessEqual(cache._expire_info[key] - time.time(), 60)
@@ -0,0 +1,74 @@
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from .question_template import create_question
+
+
+class ResultsApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='API?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:results_json', args=(self.question.id,))
+
+    def test_results_json(self):
+        """The API returns the tallies with validators."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['choices'][0]['votes'], 0)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_unknown_question(self):
+        """A missing question returns 404."""
+        response = self.client.get(reverse('polls:results_json', args=(999,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_matching_etag_returns_304_without_query(self):
+        """If-None-Match with the current ETag costs no query."""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_is_kept(self):
+        """Without a recorded change, Last-Modified holds and If-Modified-Since gets 304."""
+        cache.delete(f'polls:results:{self.question.id}:modified')
+        last_modified = self.client.get(self.url)['Last-Modified']
+        with mock.patch('polls.results.time.time', return_value=time.time() + 5):
+            response = self.client.get(self.url)
+            self.assertEqual(response['Last-Modified'], last_modified)
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_vote_changes_etag(self):
+        """A vote moves the ETag so clients fetch the new tallies."""
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(user)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 1)
+
+    def test_batch_reads_missing_results_in_one_query(self):
+        """Many questions are answered with a single query."""
+        other = create_question(question_text='Other?', days=-1)
+        url = reverse('polls:results_batch_json')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ids': f'{self.question.id},{other.id},999'})
+        texts = [results['question_text'] for results in response.json()['results']]
+        self.assertEqual(texts, ['API?', 'Other?'])
+        etag = response['ETag']
+        response = self.client.get(url, {'ids': f'{self.question.id},{other.id},999'},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_batch_bad_ids(self):
+        """ids must be integers."""
+        response = self.client.get(reverse('polls:results_batch_json'), {'ids': 'a,b'})
+        self.assertEqual(response.status_code, 400)
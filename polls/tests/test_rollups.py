@@ -0,0 +1,111 @@
+import datetime
+import io
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.export import vote_rows
+from polls.models import ArchivedVote, Vote, VoteRollup
+from polls.rollups import bucket_start, timeline
+from polls.voting import cast_vote
+from .question_template import create_question
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.question = create_question(question_text='When?', days=-1)
+        self.yes = self.question.choice_set.create(choice_text='Yes')
+        self.no = self.question.choice_set.create(choice_text='No')
+        self.users = [User.objects.create_user(f'voter{n}') for n in range(3)]
+
+    def totals(self, granularity):
+        totals = {}
+        for bucket in timeline(self.question.id, granularity):
+            for choice_id, count in bucket['choices'].items():
+                totals[choice_id] = totals.get(choice_id, 0) + count
+        return totals
+
+    def test_votes_and_changes_sum_to_the_tallies(self):
+        """Every granularity sums to the current vote counts."""
+        for user in self.users:
+            cast_vote(user, self.yes)
+        cast_vote(self.users[0], self.no)
+        for granularity in ('minute', 'hour', 'day'):
+            self.assertEqual(self.totals(granularity), {self.yes.id: 2, self.no.id: 1})
+
+    def test_vote_records_its_cast_time(self):
+        """A first vote sets cast_at and a change sets changed_at."""
+        cast_vote(self.users[0], self.yes)
+        vote = Vote.objects.get()
+        self.assertIsNotNone(vote.cast_at)
+        self.assertIsNone(vote.changed_at)
+        cast_vote(self.users[0], self.no)
+        vote.refresh_from_db()
+        self.assertIsNotNone(vote.changed_at)
+
+    def test_bucket_start_truncates_in_utc(self):
+        when = datetime.datetime(2022, 9, 1, 13, 45, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(bucket_start(when, 'hour'), when.replace(minute=0, second=0))
+        self.assertEqual(bucket_start(when, 'day'), when.replace(hour=0, minute=0, second=0))
+
+    def test_rebuild_recounts_votes_written_directly(self):
+        """rollup_votes fills buckets for votes that bypassed cast_vote."""
+        earlier = timezone.now() - datetime.timedelta(days=2)
+        for user in self.users[:2]:
+            Vote.objects.create(user=user, question=self.question, choice=self.no, cast_at=earlier)
+        call_command('rollup_votes', '--question', str(self.question.id), stdout=io.StringIO())
+        self.assertEqual(self.totals('day'), {self.no.id: 2})
+        self.assertEqual(VoteRollup.objects.filter(granularity='day').get().bucket,
+                         bucket_start(earlier, 'day'))
+
+    def test_timeline_endpoint(self):
+        cast_vote(self.users[0], self.yes)
+        url = reverse('polls:results_timeline', args=(self.question.id,))
+        response = self.client.get(url, {'granularity': 'day'})
+        buckets = response.json()['buckets']
+        self.assertEqual(len(buckets), 1)
+        self.assertEqual(buckets[0]['votes'], 1)
+        self.assertEqual(buckets[0]['choices'], {str(self.yes.id): 1})
+
+    def test_timeline_endpoint_rejects_bad_parameters(self):
+        url = reverse('polls:results_timeline', args=(self.question.id,))
+        self.assertEqual(self.client.get(url, {'granularity': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_export_since_filters_on_cast_time(self):
+        earlier = timezone.now() - datetime.timedelta(days=5)
+        Vote.objects.create(user=self.users[0], question=self.question, choice=self.yes, cast_at=earlier)
+        cast_vote(self.users[1], self.no)
+        rows = list(vote_rows(since=timezone.now() - datetime.timedelta(days=1)))
+        self.assertEqual([row[1] for row in rows], [self.users[1].id])
+
+
+class ArchivedRollupTests(TestCase):
+    def setUp(self):
+        self.question = create_question(question_text='Closed?', days=-10)
+        self.question.end_date = timezone.now() - datetime.timedelta(days=5)
+        self.question.save()
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.user = User.objects.create_user('voter')
+
+    def rebuild(self):
+        call_command('rollup_votes', stdout=io.StringIO())
+        return list(VoteRollup.objects.values_list('granularity', 'count'))
+
+    def test_archived_votes_keep_their_timeline(self):
+        """Snapshot, archive and a full rebuild keep the buckets."""
+        cast_vote(self.user, self.choice)
+        before = self.rebuild()
+        call_command('snapshot_results', '--archive-after', '1', stdout=io.StringIO())
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(len(before), 3)
+        self.assertCountEqual(self.rebuild(), before)
+
+    def test_questions_archived_without_times_are_left_alone(self):
+        ArchivedVote.objects.create(user_id=self.user.id, question_id=self.question.id,
+                                    choice_id=self.choice.id)
+        VoteRollup.objects.create(question=self.question, choice=self.choice, granularity='day',
+                                  bucket=bucket_start(timezone.now(), 'day'), count=1)
+        self.assertEqual(self.rebuild(), [('day', 1)])
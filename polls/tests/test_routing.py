@@ -0,0 +1,81 @@
+import time
+from asgiref.sync import SyncToAsync, async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mysite.middleware import ReplicaRoutingMiddleware
+from mysite.routers import PIN_COOKIE, PrimaryReplicaRouter, pin_to_primary, use_read_alias
+from polls.models import Question
+
+
+@override_settings(READ_REPLICAS=['replica0'], DATABASE_REPLICA_LAG=5.0)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request):
+        """Returns the read alias seen by the view and the response."""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Question))
+            return HttpResponse()
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_async_chain_stays_async(self):
+        """Replicas do not turn the ASGI middleware chain into a thread hop."""
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    def test_async_view_reads_from_replica(self):
+        seen = []
+
+        async def view(request):
+            seen.append(self.router.db_for_read(Question))
+            return HttpResponse()
+        response = async_to_sync(ReplicaRoutingMiddleware(view))(self.factory.post('/polls/1/vote/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        async_to_sync(ReplicaRoutingMiddleware(view))(self.factory.get('/polls/'))
+        self.assertEqual(seen, ['default', 'replica0'])
+
+    def test_reads_outside_requests_use_the_primary(self):
+        """Commands and background threads never read stale replica data."""
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+        self.assertEqual(self.router.db_for_write(Question), 'default')
+
+    def test_pin_to_primary(self):
+        """Reads inside pin_to_primary go to the primary."""
+        with use_read_alias('replica0'):
+            with pin_to_primary():
+                self.assertEqual(self.router.db_for_read(Question), 'default')
+            self.assertEqual(self.router.db_for_read(Question), 'replica0')
+
+    def test_other_views_read_from_primary(self):
+        """Only the listing and results views of READ_REPLICA_VIEWS use replicas."""
+        self.assertEqual(self.route(self.factory.get('/polls/1/'))[0], 'default')
+        self.assertEqual(self.route(self.factory.get('/admin/'))[0], 'default')
+        self.assertEqual(self.route(self.factory.get('/polls/1/results/'))[0], 'replica0')
+
+    def test_get_reads_from_replica(self):
+        """A plain GET reads from a replica and sets no cookie."""
+        alias, response = self.route(self.factory.get('/polls/'))
+        self.assertEqual(alias, 'replica0')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_post_pins_the_client_to_primary(self):
+        """A POST reads from the primary and pins the following reads."""
+        alias, response = self.route(self.factory.post('/polls/1/vote/'))
+        self.assertEqual(alias, 'default')
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5.0)
+        request = self.factory.get('/polls/1/results/')
+        request.COOKIES[PIN_COOKIE] = cookie.value
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_expired_pin_reads_from_replica(self):
+        """Once the lag has passed reads go back to the replica."""
+        request = self.factory.get('/polls/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.route(request)[0], 'replica0')
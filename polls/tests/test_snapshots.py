@@ -0,0 +1,70 @@
+import datetime
+import io
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from polls.models import ArchivedVote, Ballot, Choice, Question, ResultSnapshot, Vote
+from polls.results import get_ballot_tally, get_results
+from .question_template import create_question
+
+
+class SnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.closed = create_question(question_text='Closed?', days=-10)
+        self.closed.end_date = timezone.now() - datetime.timedelta(days=5)
+        self.closed.save()
+        self.choice = self.closed.choice_set.create(choice_text='Yes', vote_count=1)
+        Vote.objects.create(user=self.user, question=self.closed, choice=self.choice)
+        self.open = create_question(question_text='Open?', days=-1)
+
+    def run_command(self, *args):
+        call_command('snapshot_results', *args, stdout=io.StringIO())
+
+    def test_closed_questions_are_snapshotted_once(self):
+        """Only closed questions get a snapshot, and only one."""
+        self.run_command()
+        self.run_command()
+        snapshot = ResultSnapshot.objects.get()
+        self.assertEqual(snapshot.question_id, self.closed.id)
+        self.assertEqual(snapshot.closed_at, self.closed.end_date)
+        self.assertEqual(snapshot.total, 1)
+
+    def test_results_come_from_the_snapshot(self):
+        """Later changes to the live tallies do not reach the results."""
+        self.run_command()
+        Choice.objects.filter(pk=self.choice.pk).update(vote_count=7)
+        cache.clear()
+        results = get_results(self.closed.id)
+        self.assertEqual(results['total'], 1)
+        self.assertEqual(results['choices'][0]['votes'], 1)
+
+    def test_ballots_are_tallied_afresh(self):
+        """A stale cached tally does not end up in the snapshot."""
+        Question.objects.filter(pk=self.closed.pk).update(kind=Question.APPROVAL)
+        choices = [{'id': self.choice.id, 'choice_text': 'Yes'}]
+        self.assertEqual(get_ballot_tally(Question.APPROVAL, self.closed.id, choices)['total'], 0)
+        Ballot.objects.create(user=self.user, question=self.closed, choice_ids=[self.choice.id])
+        self.run_command()
+        snapshot = ResultSnapshot.objects.get()
+        self.assertEqual(snapshot.total, 1)
+        self.assertEqual(snapshot.winner, self.choice.id)
+
+    def test_archive_moves_old_votes(self):
+        """--archive-after moves votes and reconcile leaves the tallies alone."""
+        self.run_command('--archive-after', '1')
+        self.assertFalse(Vote.objects.exists())
+        self.assertEqual(ArchivedVote.objects.get().choice_id, self.choice.id)
+        self.assertIsNotNone(ResultSnapshot.objects.get().votes_archived_at)
+        call_command('reconcile_votes', stdout=io.StringIO())
+        self.choice.refresh_from_db()
+        self.assertEqual(self.choice.vote_count, 1)
+
+    def test_recent_closed_votes_are_kept(self):
+        """Votes of polls closed less than the given days ago stay."""
+        self.run_command('--archive-after', '30')
+        self.assertTrue(Vote.objects.exists())
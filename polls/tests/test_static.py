@@ -0,0 +1,80 @@
+import gzip
+import io
+import shutil
+import tempfile
+from asgiref.sync import SyncToAsync, async_to_sync
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from mysite.middleware import StaticFilesMiddleware
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.settings = override_settings(STATIC_ROOT=cls.root)
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0, stdout=io.StringIO())
+        cls.middleware = StaticFilesMiddleware(lambda request: HttpResponse('app', status=404))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.root)
+        super().tearDownClass()
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_hashed_files_are_immutable_and_precompressed(self):
+        url = staticfiles_storage.url('polls/styles.css')
+        self.assertRegex(url, r'^/static/polls/styles\.[0-9a-f]{12}\.css$')
+        response = self.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertIn(b'@font-face', gzip.decompress(b''.join(response.streaming_content)))
+
+    def test_font_urls_are_fingerprinted(self):
+        url = staticfiles_storage.url('polls/fonts/Roboto-Regular.woff')
+        self.assertRegex(url, r'^/static/polls/fonts/Roboto-Regular\.[0-9a-f]{12}\.woff$')
+        response = self.get(staticfiles_storage.url('polls/styles.css'))
+        self.assertIn(url.rsplit('/', 1)[1].encode(), b''.join(response.streaming_content))
+        self.assertEqual(self.get(url)['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.get('/static/polls/styles.css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertNotIn('Content-Encoding', response)
+        again = self.get('/static/polls/styles.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_async_chain_stays_async(self):
+        """Serving static files does not turn the ASGI chain into a thread hop."""
+        self.assertNotIsInstance(ASGIHandler()._middleware_chain, SyncToAsync)
+
+    def test_async_requests_are_served(self):
+        async def app(request):
+            return HttpResponse('app', status=404)
+        middleware = StaticFilesMiddleware(app)
+        response = async_to_sync(middleware)(RequestFactory().get('/static/polls/styles.css'))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response = async_to_sync(middleware)(RequestFactory().get('/polls/'))
+        self.assertEqual(response.content, b'app')
+
+    def test_other_paths_reach_the_app(self):
+        self.assertEqual(self.get('/static/../manage.py').content, b'app')
+        self.assertEqual(self.get('/static/polls/missing.css').content, b'app')
+        self.assertEqual(self.get('/polls/').content, b'app')
+
+    def test_index_loads_no_external_fonts(self):
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'fonts.googleapis.com')
+        self.assertContains(response, staticfiles_storage.url('polls/styles.css'))
@@ -0,0 +1,126 @@
+import math
+import time
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls.models import Ballot, Question
+from polls.results import TallyScheduler
+from polls.tally import approval, ballot_matrix, instant_runoff
+from .question_template import create_question
+
+
+class TallyEngineTests(SimpleTestCase):
+    def test_ballot_matrix(self):
+        """Choice ids become indexes, unknown ids and unused ranks -1."""
+        ranks = ballot_matrix([[30, 10], [20], [99, 20, 30]], [10, 20, 30])
+        self.assertEqual(ranks.tolist(), [[2, 0, -1], [1, -1, -1], [-1, 1, 2]])
+
+    def test_instant_runoff_transfers_votes(self):
+        """The last choice is eliminated and its ballots move on."""
+        ranks = ballot_matrix([[1]] * 4 + [[2, 3]] * 3 + [[3, 2]] * 2, [1, 2, 3])
+        rounds, winner = instant_runoff(ranks, 3)
+        self.assertEqual(rounds[0]['counts'].tolist(), [4, 3, 2])
+        self.assertEqual(rounds[0]['eliminated'], 2)
+        self.assertEqual(rounds[1]['counts'].tolist(), [4, 5, 0])
+        self.assertEqual(winner, 1)
+
+    def test_instant_runoff_counts_exhausted_ballots(self):
+        """Ballots without a running choice left are exhausted."""
+        ranks = ballot_matrix([[1]] * 3 + [[2]] * 2 + [[3]] * 2, [1, 2, 3])
+        rounds, winner = instant_runoff(ranks, 3)
+        self.assertEqual(rounds[1]['exhausted'], 2)
+        self.assertEqual(winner, 0)
+
+    def test_no_ballots(self):
+        """Without ballots there is one empty round and no winner."""
+        rounds, winner = instant_runoff(ballot_matrix([], [1, 2]), 2)
+        self.assertEqual(len(rounds), 1)
+        self.assertIsNone(winner)
+
+    def test_approval(self):
+        """Every selected choice counts once."""
+        ranks = ballot_matrix([[1, 2], [2], [2, 3]], [1, 2, 3])
+        self.assertEqual(approval(ranks, 3).tolist(), [1, 3, 1])
+
+
+class BallotVoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question(question_text='Lunch?', days=-1)
+        self.question.kind = Question.RANKED
+        self.question.save()
+        self.rice, self.noodles, self.salad = (
+            self.question.choice_set.create(choice_text=text)
+            for text in ('Rice', 'Noodles', 'Salad'))
+        self.vote_url = reverse('polls:vote', args=(self.question.id,))
+        self.results_url = reverse('polls:results', args=(self.question.id,))
+        # A scheduler without its thread, the tests run the due tallies.
+        self.scheduler = TallyScheduler(delay=2.0)
+        patcher = mock.patch('polls.results._scheduler', self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def vote(self, username, data):
+        self.client.force_login(User.objects.create_user(username, password='vote-pass'))
+        return self.client.post(self.vote_url, data)
+
+    def test_ranked_vote_and_rounds(self):
+        """Ranked ballots are stored in order and the rounds are shown."""
+        self.vote('a', {f'rank_{self.rice.id}': '1'})
+        self.vote('b', {f'rank_{self.noodles.id}': '1', f'rank_{self.salad.id}': '2'})
+        self.vote('c', {f'rank_{self.salad.id}': '1', f'rank_{self.noodles.id}': '2'})
+        self.assertEqual(Ballot.objects.get(user__username='c').choice_ids,
+                         [self.salad.id, self.noodles.id])
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'Round 2')
+        self.assertContains(response, 'Salad -- 1 (eliminated)')
+        self.assertContains(response, 'Noodles -- 2 (winner)')
+
+    def test_duplicate_ranks_are_refused(self):
+        """Two choices with the same rank are an invalid ballot."""
+        response = self.vote('a', {f'rank_{self.rice.id}': '1', f'rank_{self.salad.id}': '1'})
+        self.assertContains(response, 'different rank')
+        self.assertFalse(Ballot.objects.exists())
+
+    def test_approval_vote(self):
+        """An approval ballot counts each selected choice."""
+        self.question.kind = Question.APPROVAL
+        self.question.save()
+        self.vote('a', {'choice': [self.rice.id, self.salad.id]})
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, 'Rice -- 1')
+        self.assertContains(response, 'Noodles -- 0')
+        self.assertContains(response, 'Most approved: Rice')
+        self.assertEqual(self.client.session['polls_voted'][str(self.question.id)],
+                         [None, 'Rice, Salad'])
+
+    def test_ballot_schedules_a_tally(self):
+        """A ballot is tallied in the background, the last tally is served meanwhile."""
+        self.vote('a', {f'rank_{self.rice.id}': '1'})
+        self.assertContains(self.client.get(self.results_url), 'Rice -- 1')
+        self.vote('b', {f'rank_{self.salad.id}': '1'})
+        self.assertContains(self.client.get(self.results_url), 'Salad -- 0')
+        self.assertEqual(self.scheduler.run_due(), [])
+        self.assertEqual(self.scheduler.run_due(now=math.inf), [self.question.id])
+        self.assertContains(self.client.get(self.results_url), 'Salad -- 1')
+
+    def test_ballots_are_debounced(self):
+        """Many ballots before the due time cost one tally."""
+        for username in ('a', 'b', 'c'):
+            self.vote(username, {f'rank_{self.rice.id}': '1'})
+        with mock.patch('polls.results.store_ballot_tally') as store:
+            self.assertEqual(self.scheduler.run_due(now=math.inf), [self.question.id])
+        store.assert_called_once()
+
+    @override_settings(POLLS_TALLY_MAX_AGE=60)
+    def test_old_tally_schedules_a_new_one(self):
+        """A tally older than POLLS_TALLY_MAX_AGE is served and redone."""
+        self.client.get(self.results_url)
+        key = f'polls:tally:{self.question.id}'
+        cache.set(key, dict(cache.get(key), tallied_at=time.time() - 120), None)
+        cache.delete(f'polls:results:{self.question.id}:version')
+        self.assertContains(self.client.get(self.results_url), 'Rice -- 0')
+        self.assertEqual(self.scheduler.run_due(now=math.inf), [self.question.id])
@@ -0,0 +1,116 @@
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from polls import throttle
+from polls.models import Vote
+from .question_template import create_question
+
+
+class MemoryRateLimiterTests(SimpleTestCase):
+    def test_bucket_refills_at_rate(self):
+        limiter = throttle.MemoryRateLimiter()
+        with mock.patch('polls.throttle.time.monotonic', return_value=100.0):
+            self.assertEqual([limiter.allow('a', 2.0, 3) for _ in range(3)], [0.0] * 3)
+            self.assertAlmostEqual(limiter.allow('a', 2.0, 3), 0.5)
+            self.assertEqual(limiter.allow('b', 2.0, 3), 0.0)
+        with mock.patch('polls.throttle.time.monotonic', return_value=100.5):
+            self.assertEqual(limiter.allow('a', 2.0, 3), 0.0)
+
+    def test_least_recently_used_buckets_are_dropped(self):
+        limiter = throttle.MemoryRateLimiter(max_keys=2)
+        for key in 'abc':
+            limiter.allow(key, 1.0, 1)
+        self.assertEqual(list(limiter._buckets), ['b', 'c'])
+
+
+class CacheRateLimiterTests(SimpleTestCase):
+    def test_window_admits_burst_requests(self):
+        limiter = throttle.CacheRateLimiter()
+        with mock.patch('polls.throttle.time.time', return_value=1000.0):
+            self.assertEqual([limiter.allow('cache-test', 1.0, 2) for _ in range(2)], [0.0] * 2)
+            self.assertEqual(limiter.allow('cache-test', 1.0, 2), 2.0)
+
+
+@override_settings(POLLS_VOTE_USER_RATE=1.0, POLLS_VOTE_USER_BURST=2,
+                   POLLS_VOTE_IP_RATE=0, POLLS_VOTE_MAX_CONCURRENCY=4)
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        throttle.get_rate_limiter().reset()
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.question = create_question(question_text='Busy?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Yes')
+        self.url = reverse('polls:vote', args=(self.question.id,))
+        self.client.force_login(self.user)
+
+    def vote(self):
+        return self.client.post(self.url, {'choice': self.choice.id})
+
+    def test_rejected_votes_cost_no_queries(self):
+        """Votes beyond the burst get 429 before any session or vote query."""
+        self.assertEqual([self.vote().status_code for _ in range(2)], [302, 302])
+        with self.assertNumQueries(0):
+            response = self.vote()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Vote.objects.count(), 1)
+
+    @override_settings(POLLS_VOTE_USER_RATE=0, POLLS_VOTE_IP_RATE=1.0, POLLS_VOTE_IP_BURST=1,
+                       POLLS_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_clients_are_told_apart_by_address(self):
+        self.assertEqual(self.vote().status_code, 302)
+        self.assertEqual(self.vote().status_code, 429)
+        response = self.client.post(self.url, {'choice': self.choice.id},
+                                    HTTP_X_FORWARDED_FOR='10.0.0.1, 10.0.0.2')
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(POLLS_VOTE_USER_RATE=0, POLLS_VOTE_IP_RATE=1.0, POLLS_VOTE_IP_BURST=1,
+                       POLLS_CLIENT_IP_HEADER='')
+    def test_made_up_sessions_are_limited_by_remote_address(self):
+        """Without a proxy header the address bucket uses REMOTE_ADDR."""
+        self.client.logout()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'made-up'
+        self.assertEqual(self.vote().status_code, 302)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.vote().status_code, 429)
+        response = self.client.post(self.url, {'choice': self.choice.id}, REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_session_bucket_is_per_user(self):
+        """With signed cookie sessions a new login keeps the bucket of the user."""
+        self.client.force_login(self.user)
+        self.assertEqual([self.vote().status_code for _ in range(2)], [302, 302])
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.assertEqual(self.vote().status_code, 429)
+
+    def test_session_bucket_is_per_session(self):
+        """Other session engines cannot tell the user, a new login gets a new bucket."""
+        self.assertEqual([self.vote().status_code for _ in range(2)], [302, 302])
+        self.client.logout()
+        self.client.force_login(self.user)
+        self.assertEqual(self.vote().status_code, 302)
+
+    def test_concurrency_cap(self):
+        """A vote beyond the cap of requests in progress is turned away."""
+        throttle.vote_concurrency.active = 4
+        try:
+            response = self.vote()
+        finally:
+            throttle.vote_concurrency.active = 0
+        self.assertEqual(response.status_code, 429)
+
+    def test_slot_is_released_after_async_view(self):
+        @throttle.admission_control
+        async def view(request):
+            self.assertEqual(throttle.vote_concurrency.active, 1)
+            return HttpResponse()
+
+        response = async_to_sync(view)(RequestFactory().post('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(throttle.vote_concurrency.active, 0)
@@ -0,0 +1,66 @@
+import datetime
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from polls.voted import VOTED_SESSION_KEY, fill_voted
+from polls.voting import cast_vote
+from .question_template import create_question
+
+
+class VotedMapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.question = create_question(question_text='Tea?', days=-1)
+        self.choice = self.question.choice_set.create(choice_text='Green <tea>')
+        self.other = create_question(question_text='Coffee?', days=-2)
+        self.other.choice_set.create(choice_text='Black')
+
+    def test_login_loads_the_map(self):
+        """Votes cast before login are in the session afterwards."""
+        cast_vote(self.user, self.choice)
+        self.client.force_login(self.user)
+        voted = self.client.session[VOTED_SESSION_KEY]
+        self.assertEqual(voted, {str(self.question.id): [self.choice.id, 'Green <tea>']})
+
+    def test_vote_updates_the_map(self):
+        """A vote is shown on the shared cached index without a Vote query."""
+        self.client.force_login(self.user)
+        self.client.get(reverse('polls:index'))
+        self.client.post(reverse('polls:vote', args=(self.question.id,)),
+                         {'choice': self.choice.id})
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('polls:index'))
+        self.assertContains(response, 'You voted Green &lt;tea&gt;', count=1)
+
+    def test_map_only_holds_open_questions(self):
+        """Votes on closed questions are left out of the map."""
+        self.other.end_date = timezone.now() - datetime.timedelta(hours=1)
+        self.other.save()
+        cast_vote(self.user, self.choice)
+        cast_vote(self.user, self.other.choice_set.get())
+        self.client.force_login(self.user)
+        self.assertEqual(list(self.client.session[VOTED_SESSION_KEY]), [str(self.question.id)])
+
+    def test_detail_finds_votes_missing_from_the_map(self):
+        """A vote cast from another session is read on the detail page and kept."""
+        self.client.force_login(self.user)
+        cast_vote(self.user, self.choice)
+        response = self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, 'You voted Green &lt;tea&gt;')
+        self.assertEqual(self.client.session[VOTED_SESSION_KEY],
+                         {str(self.question.id): [self.choice.id, 'Green <tea>']})
+
+    def test_anonymous_index_has_no_markers(self):
+        """The markers of the fragment never reach the page."""
+        response = self.client.get(reverse('polls:index'))
+        self.assertNotContains(response, 'polls:voted')
+        self.assertNotContains(response, 'You voted')
+
+    def test_fill_voted(self):
+        """Markers of voted questions become the choice, others vanish."""
+        html = fill_voted('<!--polls:voted:1-->|<!--polls:voted:2-->', {'1': [3, 'Yes']})
+        self.assertEqual(html, '<span class="voted">You voted Yes</span>|')
@@ -0,0 +1,114 @@
+import datetime
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from unittest import mock
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from polls import voting
+from polls.models import Choice, Question, Vote
+from polls.results import get_results
+from .question_template import create_question
+
+
+class VoteTallyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('voter', password='vote-pass')
+        self.client.force_login(self.user)
+        self.question = create_question(question_text='Tally?', days=-1)
+        self.first = self.question.choice_set.create(choice_text='First')
+        self.second = self.question.choice_set.create(choice_text='Second')
+
+    def vote(self, choice):
+        url = reverse('polls:vote', args=(self.question.id,))
+        return self.client.post(url, {'choice': choice.id})
+
+    def test_vote_increments_tally(self):
+        """A first vote adds one to the selected choice."""
+        self.vote(self.first)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_change_vote_moves_tally(self):
+        """Voting again moves the tally point to the new choice."""
+        self.vote(self.first)
+        self.vote(self.second)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+        self.assertEqual(self.second.votes, 1)
+        self.assertEqual(Vote.objects.filter(user=self.user).count(), 1)
+
+    def test_votes_does_not_query(self):
+        """Reading Choice.votes uses the stored tally."""
+        self.vote(self.first)
+        choice = Choice.objects.get(pk=self.first.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(choice.votes, 1)
+
+    def test_reconcile_votes_fixes_drift(self):
+        """reconcile_votes recounts tallies from the Vote table."""
+        self.vote(self.first)
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=7)
+        call_command('reconcile_votes', stdout=StringIO())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_reconcile_votes_invalidates_cached_results(self):
+        """Repaired tallies are served, also for a closed poll cached for good."""
+        self.vote(self.first)
+        Question.objects.filter(pk=self.question.pk).update(
+            end_date=timezone.now() - datetime.timedelta(hours=1))
+        Choice.objects.filter(pk=self.first.pk).update(vote_count=0)
+        cache.clear()
+        self.assertEqual(get_results(self.question.pk)['total'], 0)
+        call_command('reconcile_votes', stdout=StringIO())
+        self.assertEqual(get_results(self.question.pk)['total'], 1)
+
+    def test_vote_records_question(self):
+        """A vote stores its question for the uniqueness constraint."""
+        self.vote(self.first)
+        self.assertEqual(Vote.objects.get(user=self.user).question, self.question)
+
+    def test_one_vote_per_question(self):
+        """The database rejects a second vote row on the same question."""
+        self.vote(self.first)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Vote.objects.create(
+                user=self.user, question=self.question, choice=self.second)
+
+    def test_cast_vote_returns_previous_choice(self):
+        """cast_vote returns None, then the choice the vote moved away from."""
+        self.assertIsNone(voting.cast_vote(self.user, self.first))
+        self.assertEqual(voting.cast_vote(self.user, self.second), self.first.pk)
+        self.assertEqual(voting.cast_vote(self.user, self.second), self.second.pk)
+        vote = Vote.objects.get(user=self.user)
+        self.assertEqual(vote.moved_from, self.first.pk)
+        self.assertIsNotNone(vote.changed_at)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.votes, 1)
+
+    def test_same_choice_writes_once(self):
+        """Voting again for the same choice is a single statement."""
+        voting.cast_vote(self.user, self.first)
+        with CaptureQueriesContext(connection) as queries:
+            voting.cast_vote(self.user, self.first)
+        statements = [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertIn('ON CONFLICT', statements[0])
+
+    def test_fallback_without_upsert(self):
+        """Databases without INSERT ... RETURNING read and update the row."""
+        with mock.patch('polls.voting._upsert_vote') as upsert, \
+                mock.patch.object(voting.connection, 'vendor', 'other'):
+            self.assertIsNone(voting.cast_vote(self.user, self.first))
+            self.assertEqual(voting.cast_vote(self.user, self.second), self.first.pk)
+        upsert.assert_not_called()
+        self.assertEqual(Vote.objects.get(user=self.user).moved_from, self.first.pk)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
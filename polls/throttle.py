@@ -0,0 +1,256 @@
+"""Admission control in front of the vote views.
+
+admission_control rejects a request with 429 Too Many Requests before
+the view runs, so rejected votes touch neither the session, the user
+nor the database. A request is rejected when its user or its client
+address has used up its token bucket, or when POLLS_VOTE_MAX_CONCURRENCY
+votes are already in progress in this process.
+
+The user bucket is per user with signed cookie sessions and per session
+with the other engines, whose cookie does not tell the user without a
+lookup: logging in again starts a full bucket. The address bucket also
+holds back clients without a session cookie or with a made up one. It
+is keyed by REMOTE_ADDR, or by the header named by POLLS_CLIENT_IP_HEADER
+behind a proxy, where REMOTE_ADDR is the proxy for every client.
+
+The buckets live in a rate limiter chosen by POLLS_RATE_LIMIT_BACKEND.
+MemoryRateLimiter only sees the requests of its own process, so with N
+worker processes a client gets up to N times the configured rate;
+CacheRateLimiter shares its counters through the default cache, which
+must then be a shared one such as memcached or redis (CACHE_BACKEND).
+It is the default when it is.
+"""
+import asyncio
+import functools
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends import signed_cookies
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+
+class BaseRateLimiter:
+    """Interface of a rate limiter.
+
+    Attributes:
+        max_keys (int): Most buckets kept, where the limiter has a bound.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+
+    def allow(self, key, rate, burst):
+        """Take one token from the bucket of key.
+
+        Args:
+            key: Bucket name.
+            rate: Tokens added per second.
+            burst: Size of the bucket.
+
+        Returns:
+            0 when the request is admitted, else the seconds until a
+            token is available.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget every bucket."""
+        raise NotImplementedError
+
+
+class MemoryRateLimiter(BaseRateLimiter):
+    """Token buckets of the current process.
+
+    A bucket is a (tokens, updated) pair in an LRU ordered dict, the
+    least recently used buckets are dropped beyond max_keys, which only
+    ever gives their clients a full bucket again.
+    """
+
+    def __init__(self, max_keys=100000):
+        super().__init__(max_keys)
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def allow(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if wait == 0 else tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheRateLimiter(BaseRateLimiter):
+    """Buckets shared by every process through the default cache.
+
+    Only shared when the default cache is, with LocMemCache every process
+    still counts alone. Caches have no compare-and-set, so a bucket is approximated by a
+    counter per window of burst / rate seconds, which admits at most
+    burst requests per window. cache.incr is atomic on memcached and
+    redis.
+    """
+
+    def allow(self, key, rate, burst):
+        window = burst / rate
+        now = time.time()
+        cache_key = f'throttle:{key}:{int(now // window)}'
+        cache.add(cache_key, 0, math.ceil(window) + 1)
+        try:
+            count = cache.incr(cache_key)
+        except ValueError:
+            # The window expired between add and incr.
+            return 0.0
+        if count <= burst:
+            return 0.0
+        return window - now % window
+
+    def reset(self):
+        # The windows expire by themselves.
+        pass
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Returns the rate limiter of this process, see POLLS_RATE_LIMIT_BACKEND."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            limiter_class = import_string(settings.POLLS_RATE_LIMIT_BACKEND)
+            _limiter = limiter_class(max_keys=settings.POLLS_RATE_LIMIT_MAX_KEYS)
+    return _limiter
+
+
+class ConcurrencyLimiter:
+    """Counter of the requests in progress in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+
+    def acquire(self, limit):
+        """Returns True and counts the request when fewer than limit run."""
+        with self._lock:
+            if self.active >= limit:
+                return False
+            self.active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+vote_concurrency = ConcurrencyLimiter()
+
+
+def client_address(request):
+    """Returns the address of the client of request.
+
+    With POLLS_CLIENT_IP_HEADER set, for example to HTTP_X_FORWARDED_FOR
+    behind a proxy, the last address of that header is used, the one
+    the trusted proxy appended.
+    """
+    if settings.POLLS_CLIENT_IP_HEADER:
+        forwarded = request.META.get(settings.POLLS_CLIENT_IP_HEADER, '')
+        if forwarded:
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _user_key(session):
+    """Returns the bucket name of the client with session cookie session.
+
+    A signed cookie session holds the user id, it is checked and read
+    without a query. Other engines only give the session key, hashed to
+    keep keys short, so their bucket is per session.
+    """
+    if settings.SESSION_ENGINE == signed_cookies.__name__:
+        user_id = signed_cookies.SessionStore(session).get(SESSION_KEY)
+        if user_id is not None:
+            return f'user:{user_id}'
+    digest = hashlib.blake2b(session.encode(), digest_size=8).hexdigest()
+    return f'session:{digest}'
+
+
+def _bucket_keys(request):
+    """Yield (key, rate, burst) of the buckets request draws from."""
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session and settings.POLLS_VOTE_USER_RATE:
+        yield _user_key(session), settings.POLLS_VOTE_USER_RATE, settings.POLLS_VOTE_USER_BURST
+    if settings.POLLS_VOTE_IP_RATE:
+        yield (f'ip:{client_address(request)}', settings.POLLS_VOTE_IP_RATE,
+               settings.POLLS_VOTE_IP_BURST)
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests', status=429, content_type='text/plain')
+    response['Retry-After'] = max(1, math.ceil(retry_after))
+    return response
+
+
+def _admit(request):
+    """Returns a 429 response for a rejected request, else None.
+
+    An admitted request holds a concurrency slot when the cap is on, see
+    _leave.
+    """
+    limiter = get_rate_limiter()
+    for key, rate, burst in _bucket_keys(request):
+        wait = limiter.allow(key, rate, burst)
+        if wait:
+            return too_many_requests(wait)
+    if settings.POLLS_VOTE_MAX_CONCURRENCY and not vote_concurrency.acquire(
+            settings.POLLS_VOTE_MAX_CONCURRENCY):
+        return too_many_requests(settings.POLLS_VOTE_BUSY_RETRY_AFTER)
+    return None
+
+
+def _leave():
+    if settings.POLLS_VOTE_MAX_CONCURRENCY:
+        vote_concurrency.release()
+
+
+def admission_control(view):
+    """Decorate a sync or async view with the vote rate limits.
+
+    Place it outermost, above login_required, so a rejected request does
+    not load the session or the user.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            rejected = _admit(request)
+            if rejected is not None:
+                return rejected
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _leave()
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        rejected = _admit(request)
+        if rejected is not None:
+            return rejected
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _leave()
+    return wrapper
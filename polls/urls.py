@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'polls'
 
@@ -10,9 +11,25 @@ app_name = 'polls'
 #     path('<int:question_id>/vote/', views.vote, name='vote'),
 # ]
 
+if settings.POLLS_ASYNC_VIEWS:
+    index_view = async_views.index
+    results_view = async_views.results
+    vote_view = async_views.vote
+else:
+    index_view = views.IndexView.as_view()
+    results_view = views.ResultsView.as_view()
+    vote_view = views.vote
+
 urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
+    path('', index_view, name='index'),
     path('<int:pk>/', views.DetailView.as_view(), name='detail'),
-    path('<int:pk>/results/', views.ResultsView.as_view(), name='results'),
-    path('<int:question_id>/vote/', views.vote, name='vote'),
+    path('<int:pk>/results/', results_view, name='results'),
+    path('<int:pk>/results/stream/', views.results_stream, name='results_stream'),
+    path('<int:question_id>/vote/', vote_view, name='vote'),
+    path('archive/', views.ArchiveView.as_view(), name='archive'),
+    path('api/questions/', views.question_list_json, name='question_list_json'),
+    path('api/results/', views.results_batch_json, name='results_batch_json'),
+    path('api/results/<int:pk>/', views.results_json, name='results_json'),
+    path('api/results/<int:pk>/timeline/', views.results_timeline, name='results_timeline'),
+    path('vote-buffer/', views.vote_buffer_stats, name='vote_buffer_stats'),
 ]
@@ -1,18 +1,40 @@
+import json
+import time
 from django.shortcuts import render, get_object_or_404, redirect
-from django.utils import timezone
-from django.http import HttpResponseRedirect, Http404
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (HttpResponse, HttpResponseRedirect, Http404,
+                         JsonResponse, StreamingHttpResponse)
+from django.db.models import prefetch_related_objects
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views import generic
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from polls.models import Choice, Question, Vote
+from polls.buffer import get_vote_buffer
+from polls.fragments import get_index_fragment
+from polls.export import parse_when
+from polls.models import Choice, Question, VoteRollup
+from polls.pagination import keyset_page
+from polls.pubsub import get_broker, live_results_enabled, snapshot
+from polls.rollups import timeline
+from polls.throttle import admission_control
+from polls.results import (bump_results_version, get_many_results, get_results,
+                           get_results_modified, get_results_versions, schedule_tally)
+from polls.voted import fill_voted, get_voted, lookup_voted, remember_ballot, remember_vote
+from polls.voting import cast_ballot, cast_vote, parse_ballot
 
 
 # generic views
 class IndexView(generic.ListView):
     """This is IndexView that displays a list of questions.
 
+    The question list is rendered from a cached fragment, see
+    polls.fragments, so a cache hit costs no query. The user's own votes
+    come from the session, see polls.voted.
+
     Attributes:
         template_name: The name of the template used to render the index.
         context_object_name: The name of the context objects.
@@ -23,9 +45,94 @@ class IndexView(generic.ListView):
 
     def get_queryset(self):
         """Return the last five published questions (not including future)."""
-        question = Question.objects.filter(pub_date__lte=timezone.now())
+        question = Question.objects.published().with_is_open()
         return question.order_by('-pub_date')[:5]
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['question_list_html'] = fill_voted(
+            get_index_fragment(context['latest_question_list']),
+            get_voted(self.request))
+        return context
+
+
+def archive_questions(status):
+    """Returns the questions listed by the archive for a status filter.
+
+    Args:
+        status: 'open', 'closed', 'upcoming' or '' for every published one.
+
+    Raises:
+        ValueError: status is not a known filter.
+    """
+    questions = Question.objects.with_is_open()
+    if status == 'open':
+        return questions.open()
+    if status == 'closed':
+        return questions.closed()
+    if status == 'upcoming':
+        return questions.upcoming()
+    if status == '':
+        return questions.published()
+    raise ValueError(f'Unknown status {status!r}')
+
+
+class ArchiveView(generic.ListView):
+    """ArchiveView lists every question, page by page.
+
+    Attributes:
+        template_name: The name of the template used to render the archive.
+        context_object_name: The name of the context objects.
+        per_page: Number of questions per page.
+
+    Methods:
+        get_queryset: Get one page of questions after the cursor.
+    """
+
+    template_name = 'polls/archive.html'
+    context_object_name = 'question_list'
+    per_page = 20
+
+    def get_queryset(self):
+        """Return the page of questions after the cursor in the query."""
+        self.status = self.request.GET.get('status', '')
+        try:
+            questions, self.next_cursor = keyset_page(
+                archive_questions(self.status),
+                self.request.GET.get('cursor'), self.per_page)
+        except ValueError:
+            raise Http404('Invalid page')
+        return questions
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['status'] = self.status
+        context['next_cursor'] = self.next_cursor
+        return context
+
+
+def question_list_json(request):
+    """Return one page of the archive as JSON.
+
+    The query accepts status, cursor and limit (at most 100).
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+        questions, next_cursor = keyset_page(
+            archive_questions(request.GET.get('status', '')),
+            request.GET.get('cursor'), limit)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    results = [{
+        'id': question.pk,
+        'question_text': question.question_text,
+        'pub_date': question.pub_date,
+        'end_date': question.end_date,
+        'is_open': question.is_open,
+        'url': reverse('polls:detail', args=(question.pk,)),
+    } for question in questions]
+    return JsonResponse({'results': results, 'next': next_cursor})
+
 
 class DetailView(LoginRequiredMixin, generic.DetailView):
     """DetailView can displays a question with a choice.
@@ -44,7 +151,7 @@ class DetailView(LoginRequiredMixin, generic.DetailView):
 
     def get_queryset(self):
         """Excludes any questions that aren't published yet."""
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return Question.objects.published()
 
     def get(self, request, pk):
         """Excludes any questions that aren't published yet and except error.
@@ -54,23 +161,22 @@ class DetailView(LoginRequiredMixin, generic.DetailView):
         """
 
         redirect = HttpResponseRedirect(reverse('polls:index'))
+        questions = Question.objects.prefetch_related('choice_set')
         try:
-            self.question = get_object_or_404(Question, pk=pk)
+            self.question = get_object_or_404(questions, pk=pk)
         except IndexError:
             messages.error(request, 'Index not found')
             return redirect
         except Http404:
             messages.error(request, 'Http404 not found')
             return redirect
-        try:
-            self.check_vote = Vote.objects.filter(user=request.user)[0]
-            self.check_vote = self.check_vote.choice.choice_text
-        except IndexError:
-            self.check_vote = None
         if not self.question.can_vote():
             messages.error(request, "This question can't vote")
             return redirect
-        dict_re = {'question': self.question, 'check_choice': self.check_vote}
+        vote = get_voted(request).get(str(self.question.id)) or lookup_voted(request, self.question)
+        self.check_vote, voted_text = vote or (None, None)
+        dict_re = {'question': self.question, 'check_choice': self.check_vote,
+                   'voted_text': voted_text}
         return render(request, 'polls/detail.html', dict_re)
 
 
@@ -80,13 +186,146 @@ class ResultsView(generic.DetailView):
     Attributes:
         model: Question class.
         template_name: The name of the template used to render to detail.
+        context_object_name: The name of the results in the context.
+
+    Methods:
+        get_object: Get the cached results of the question.
     """
 
     model = Question
     template_name = 'polls/results.html'
+    context_object_name = 'question'
+
+    def get_object(self, queryset=None):
+        """Returns the results dict of the question, see polls.results."""
+        results = get_results(self.kwargs['pk'])
+        if results is None:
+            raise Http404('No question found matching the query')
+        return results
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(live_results=live_results_enabled(), **kwargs)
+
+
+def conditional_results(request, question_ids, payload):
+    """Answer a results API request with ETag and Last-Modified.
+
+    The validators come from the results versions in the cache, so a
+    matching If-None-Match or If-Modified-Since gets a 304 without any
+    database query.
+
+    Args:
+        question_ids: Ids of the questions in the response.
+        payload: Function of the results dict that returns the JSON data.
+    """
+    versions = get_results_versions(question_ids)
+    tag = '-'.join(f'{question_id}.{versions[question_id]}' for question_id in question_ids)
+    etag = quote_etag(tag)
+    last_modified = int(max(get_results_modified(question_ids).values()))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        results = get_many_results(question_ids)
+        if len(question_ids) == 1 and not results:
+            raise Http404('No question found matching the query')
+        response = JsonResponse(payload(results))
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def results_json(request, pk):
+    """Return the results of one question as JSON."""
+    return conditional_results(request, [pk], lambda results: results[pk])
+
+
+def results_batch_json(request):
+    """Return the results of many questions as JSON.
+
+    The query names the questions as ids=1,2,3, at most 100 of them.
+    Missing questions are left out of the response.
+    """
+    try:
+        question_ids = sorted({int(pk) for pk in request.GET.get('ids', '').split(',')})
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma separated list of ids'}, status=400)
+    if len(question_ids) > 100:
+        return JsonResponse({'error': 'At most 100 ids per request'}, status=400)
+    return conditional_results(
+        request, question_ids,
+        lambda results: {'results': [results[pk] for pk in question_ids if pk in results]})
+
+
+def results_timeline(request, pk):
+    """Return the turnout of a question over time as JSON.
+
+    The query may give granularity (minute, hour or day, hour by default)
+    and since and until as ISO dates. Only the rollups are read, see
+    polls.rollups, so the cost follows the number of buckets.
+    """
+    granularity = request.GET.get('granularity', VoteRollup.HOUR)
+    try:
+        since, until = (parse_when(request.GET[name]) if request.GET.get(name) else None
+                        for name in ('since', 'until'))
+        buckets = timeline(pk, granularity, since, until)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({'question': pk, 'granularity': granularity, 'buckets': buckets})
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def results_stream(request, pk):
+    """Stream the tallies of a question as Server-Sent Events.
+
+    The first 'results' event holds every tally, then each 'delta' event
+    holds the changed ones. The stream ends after POLLS_SSE_MAX_DURATION
+    seconds and the browser reconnects by itself. Answers 404 unless
+    polls.pubsub.live_results_enabled.
+
+    The subscription is taken when the response starts streaming, so a
+    response that is never iterated holds no slot of the broker.
+    """
+    if not live_results_enabled():
+        raise Http404('Live results are turned off')
+    results = get_results(pk)
+    if results is None:
+        raise Http404('No question found matching the query')
+    broker = get_broker()
+    if broker.is_full():
+        response = HttpResponse('Too many live results streams', status=503)
+        response['Retry-After'] = int(settings.POLLS_SSE_HEARTBEAT)
+        return response
+
+    def events():
+        subscription = broker.subscribe(pk)
+        if subscription is None:
+            # Filled up since the check, ask the browser to come back later.
+            yield f'retry: {int(settings.POLLS_SSE_HEARTBEAT * 1000)}\n\n'
+            return
+        try:
+            yield sse_event('results', snapshot(results))
+            deadline = time.monotonic() + settings.POLLS_SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                delta = subscription.get(settings.POLLS_SSE_HEARTBEAT)
+                if delta is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield sse_event('delta', delta)
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 # same with original
+@admission_control
 @login_required
 def vote(request, question_id):
     """To vote a choice for each question.
@@ -98,6 +337,8 @@ def vote(request, question_id):
     if not user.is_authenticated:
         return redirect('login')
     question = get_object_or_404(Question, pk=question_id)
+    if question.uses_ballots():
+        return ballot_vote(request, question)
     try:
         selected_choice = question.choice_set.get(pk=request.POST['choice'])
     except (KeyError, Choice.DoesNotExist):
@@ -108,18 +349,45 @@ def vote(request, question_id):
         if not question.can_vote():
             messages.error(request, 'User cannot vote')
             return HttpResponseRedirect(reverse('polls:index'))
-        chk = Vote.objects.filter(user=request.user, choice__question=question)
-        vote = chk
-        if chk.count() == 0:
-            vote = Vote(user=user, choice=selected_choice)
-        else:
-            vote = chk[0]
-            vote.choice = selected_choice
-        vote.save()
+        buffered = settings.POLLS_VOTE_BUFFER and get_vote_buffer().submit(
+            user.pk, question.id, selected_choice.id)
+        if not buffered:
+            cast_vote(user, selected_choice)
+            bump_results_version(question.id)
+        remember_vote(request, question.id, selected_choice)
         reverse_result = reverse('polls:results', args=[question.id],)
         return HttpResponseRedirect(reverse_result)
 
 
+def ballot_vote(request, question):
+    """To vote on a ranked or approval question.
+
+    args:
+        question: The question, its kind uses ballots.
+    """
+    prefetch_related_objects([question], 'choice_set')
+    try:
+        choice_ids = parse_ballot(question, request.POST)
+    except ValueError as error:
+        return render(request, 'polls/detail.html',
+                      {'question': question, 'error_message': str(error)})
+    if not question.can_vote():
+        messages.error(request, 'User cannot vote')
+        return HttpResponseRedirect(reverse('polls:index'))
+    cast_ballot(request.user, question, choice_ids)
+    schedule_tally(question.id)
+    remember_ballot(request, question, choice_ids)
+    return HttpResponseRedirect(reverse('polls:results', args=[question.id]))
+
+
+@staff_member_required
+def vote_buffer_stats(request):
+    """Return the metrics of the vote buffer as JSON."""
+    if not settings.POLLS_VOTE_BUFFER:
+        return JsonResponse({'enabled': False})
+    return JsonResponse(dict(get_vote_buffer().stats(), enabled=True))
+
+
 def redirect_index(self):
     """Redirect to index page."""
     return HttpResponseRedirect(reverse('polls:index'))
@@ -0,0 +1,116 @@
+"""Map of the questions a user voted on, kept in the session.
+
+The map is read from the Vote table once, when the user logs in (see
+polls.signals), and updated by the vote views afterwards, so the index
+shows "you voted" without a Vote query. It only holds the questions
+open at login, the ones that can still be voted on, which keeps the
+session small. Votes cast from another session are missing from it, so
+the detail page reads the vote of a question missing from the map from
+the database, see lookup_voted.
+
+The index fragment is shared by every user, so it only carries a marker
+comment per question; fill_voted replaces the markers with the user's
+own choices after the fragment is read from the cache.
+"""
+import re
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from polls.models import Ballot, Choice, Question, Vote
+
+VOTED_SESSION_KEY = 'polls_voted'
+_MARKER = re.compile(r'<!--polls:voted:(\d+)-->')
+
+
+def load_voted(session, user):
+    """Read the votes of user on open questions into session, returns the map.
+
+    The map goes from question id, as a string since the session is JSON,
+    to a [choice id, choice text] pair. A ballot of a ranked or approval
+    question has no single choice, its pair is [None, the choice texts].
+    """
+    open_questions = Question.objects.open().values('pk')
+    voted = {str(question_id): [choice_id, choice_text]
+             for question_id, choice_id, choice_text
+             in (Vote.objects.filter(user=user, question__in=open_questions)
+                 .values_list('question_id', 'choice_id', 'choice__choice_text'))}
+    ballots = list(Ballot.objects.filter(user=user, question__in=open_questions)
+                   .values_list('question_id', 'choice_ids'))
+    if ballots:
+        texts = dict(Choice.objects.filter(question_id__in=[row[0] for row in ballots])
+                     .values_list('pk', 'choice_text'))
+        for question_id, choice_ids in ballots:
+            voted[str(question_id)] = [None, ballot_text(
+                [texts[choice_id] for choice_id in choice_ids if choice_id in texts])]
+    session[VOTED_SESSION_KEY] = voted
+    return voted
+
+
+def get_voted(request):
+    """Returns the voted map of the user of request, {} for anonymous users."""
+    if not request.user.is_authenticated:
+        return {}
+    voted = request.session.get(VOTED_SESSION_KEY)
+    if voted is None:
+        voted = load_voted(request.session, request.user)
+    return voted
+
+
+def lookup_voted(request, question):
+    """Returns the vote of the user of request on question, from the database.
+
+    A vote found is added to the map. The choices of question must be
+    prefetched.
+
+    Returns:
+        The [choice id, choice text] pair of the map, or None.
+    """
+    texts = {choice.id: choice.choice_text for choice in question.choice_set.all()}
+    if question.uses_ballots():
+        choice_ids = (Ballot.objects.filter(user=request.user, question=question)
+                      .values_list('choice_ids', flat=True).first())
+        vote = None if choice_ids is None else [None, ballot_text(
+            [texts[choice_id] for choice_id in choice_ids if choice_id in texts])]
+    else:
+        choice_id = (Vote.objects.filter(user=request.user, question=question)
+                     .values_list('choice_id', flat=True).first())
+        vote = None if choice_id is None else [choice_id, texts.get(choice_id)]
+    if vote is not None:
+        _remember(request, question.id, vote)
+    return vote
+
+
+def remember_vote(request, question_id, choice):
+    """Record in the session that the user of request voted choice."""
+    _remember(request, question_id, [choice.id, choice.choice_text])
+
+
+def remember_ballot(request, question, choice_ids):
+    """Record in the session the ballot of the user of request on question.
+
+    The choices of question must be prefetched.
+    """
+    texts = {choice.id: choice.choice_text for choice in question.choice_set.all()}
+    _remember(request, question.id, [None, ballot_text([texts[choice_id] for choice_id in choice_ids])])
+
+
+def _remember(request, question_id, vote):
+    """Store vote in the map, the session is only saved when it changed."""
+    voted = get_voted(request)
+    if voted.get(str(question_id)) != vote:
+        voted[str(question_id)] = vote
+        request.session[VOTED_SESSION_KEY] = voted
+
+
+def ballot_text(texts):
+    """Returns the choice texts of a ballot as one line."""
+    return ', '.join(texts)
+
+
+def fill_voted(html, voted):
+    """Replace the voted markers of a rendered question list."""
+    def replace(match):
+        vote = voted.get(match.group(1))
+        if vote is None:
+            return ''
+        return format_html('<span class="voted">You voted {}</span>', vote[1])
+    return mark_safe(_MARKER.sub(replace, html))
@@ -0,0 +1,142 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from polls.models import Ballot, Choice, Question, Vote
+from polls.rollups import record_vote_events
+
+
+def cast_vote(user, choice):
+    """Record a vote of user for choice and keep the choice tallies in step.
+
+    A user has at most one vote per question (see Vote.Meta.constraints),
+    so voting again on the same question moves the vote, and one tally
+    point, to the new choice.
+
+    Args:
+        user: User who votes.
+        choice: Choice selected by the user.
+
+    Returns:
+        The id of the previously selected choice, or None for a first vote.
+    """
+    if connection.vendor in ('sqlite', 'postgresql') and \
+            connection.features.can_return_columns_from_insert:
+        return _upsert_vote(user, choice)
+    try:
+        return _update_or_create_vote(user, choice)
+    except IntegrityError:
+        # A concurrent first vote of the same user won the insert, so the
+        # row exists now and the second attempt updates it.
+        return _update_or_create_vote(user, choice)
+
+
+def _upsert_vote(user, choice):
+    """Insert or move the vote row with one INSERT ... ON CONFLICT statement.
+
+    A moved vote keeps the choice it left in moved_from, which RETURNING
+    hands back. A vote for the choice already selected updates no row and
+    returns nothing.
+    """
+    now = timezone.now()
+    question_id = choice.question_id
+    table = Vote._meta.db_table
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, question_id, choice_id, cast_at) '
+                f'VALUES (%s, %s, %s, %s) ON CONFLICT (user_id, question_id) '
+                f'DO UPDATE SET choice_id = excluded.choice_id, '
+                f'changed_at = excluded.cast_at, moved_from = {table}.choice_id '
+                f'WHERE {table}.choice_id <> excluded.choice_id RETURNING moved_from',
+                [user.pk, question_id, choice.pk,
+                 connection.ops.adapt_datetimefield_value(now)])
+            row = cursor.fetchone()
+        if row is None:
+            return choice.pk
+        _count_vote(question_id, row[0], choice.pk, now)
+        return row[0]
+
+
+def _update_or_create_vote(user, choice):
+    """Insert or update the vote row and the tallies in one transaction."""
+    now = timezone.now()
+    question_id = choice.question_id
+    with transaction.atomic():
+        previous = (Vote.objects.select_for_update()
+                    .filter(user=user, question_id=question_id)
+                    .values_list('pk', 'choice_id').first())
+        if previous is None:
+            Vote.objects.create(
+                user=user, question_id=question_id, choice=choice, cast_at=now)
+            _count_vote(question_id, None, choice.pk, now)
+            return None
+        vote_id, previous_id = previous
+        if previous_id != choice.pk:
+            Vote.objects.filter(pk=vote_id).update(
+                choice=choice, changed_at=now, moved_from=previous_id)
+            _count_vote(question_id, previous_id, choice.pk, now)
+        return previous_id
+
+
+def _count_vote(question_id, previous_id, choice_id, now):
+    """Move one tally point and the rollups from previous_id to choice_id.
+
+    previous_id is None for a first vote.
+    """
+    if previous_id is None:
+        Choice.objects.filter(pk=choice_id).update(vote_count=F('vote_count') + 1)
+        record_vote_events([(question_id, choice_id, now, 1)])
+        return
+    Choice.objects.filter(pk__in=[previous_id, choice_id]).update(
+        vote_count=Case(
+            When(pk=choice_id, then=F('vote_count') + 1),
+            default=F('vote_count') - 1))
+    record_vote_events([(question_id, choice_id, now, 1),
+                        (question_id, previous_id, now, -1)])
+
+
+def parse_ballot(question, data):
+    """Returns the choice ids of a ranked or approval ballot form.
+
+    An approval ballot sends the ids of the selected choices as 'choice',
+    a ranked ballot sends 'rank_<choice id>' with a rank from 1.
+
+    Args:
+        question: Question with its choices prefetched.
+        data: The POST QueryDict.
+
+    Returns:
+        List of choice ids, in order of preference for a ranked ballot.
+
+    Raises:
+        ValueError: The form selects no choice or is malformed.
+    """
+    choice_ids = [choice.id for choice in question.choice_set.all()]
+    if question.kind == Question.APPROVAL:
+        selected = set(data.getlist('choice'))
+        ballot = [choice_id for choice_id in choice_ids if str(choice_id) in selected]
+    else:
+        ranks = {}
+        for choice_id in choice_ids:
+            value = data.get(f'rank_{choice_id}', '').strip()
+            if value:
+                try:
+                    ranks[choice_id] = int(value)
+                except ValueError:
+                    raise ValueError('Ranks must be numbers')
+        if len(set(ranks.values())) != len(ranks) or any(rank < 1 for rank in ranks.values()):
+            raise ValueError('Give each ranked choice a different rank')
+        ballot = sorted(ranks, key=ranks.get)
+    if not ballot:
+        raise ValueError("You didn't select a choice")
+    return ballot
+
+
+def cast_ballot(user, question, choice_ids):
+    """Record or replace the ballot of user on a ranked or approval question.
+
+    Ballots are tallied by polls.tally when the results are computed, so
+    no tally is kept in step here.
+    """
+    Ballot.objects.update_or_create(
+        user=user, question=question, defaults={'choice_ids': choice_ids})